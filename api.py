@@ -1,23 +1,76 @@
 """FastAPI REST API for the RAG AI Assistant."""
 
+import asyncio
+import json
+import logging
+import sqlite3
 import time
-from contextlib import asynccontextmanager
-
-from fastapi import FastAPI, HTTPException, UploadFile
+from contextlib import aclosing, asynccontextmanager, suppress
+from typing import Annotated
+
+from fastapi import (
+    BackgroundTasks,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+)
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
+from starlette.background import BackgroundTask
 
 from src import conversation_store as cs
+from src import ingest_jobs, profiling, retention, tracing, warmup
 from src.document_loader import load_csv, load_docx, load_pdf, load_txt, load_web
 from src.evaluation import evaluate_response
-from src.llm import get_llm, reset_llm
-from src.rag_chain import ask_question, reset_chain
-from src.text_splitter import split_documents
-from src.vector_store import add_documents, clear_store, get_document_count, list_sources
+from src.llm import get_llm, get_llm_provider, reset_llm
+from src.metrics import render as render_metrics
+from src.rag_chain import (
+    aask_question,
+    aask_question_stream,
+    ask_questions,
+    coalescing_key,
+    estimate_prompt_tokens,
+)
+from src.single_flight import SingleFlight
+from src.summarizer import LAST_TURN_MESSAGES, arefresh_summary
+from src.vector_store import clear_store, get_document_count, get_store_stats
+
+logger = logging.getLogger(__name__)
+
+# Identical questions asked concurrently share one retrieval and generation.
+_flights = SingleFlight()
+# Set once warm-up has finished and cleared when shutdown begins; served by /readyz.
+_ready = False
+
+
+async def _warm_up() -> None:
+    global _ready
+    try:
+        await warmup.warm_up()
+    except Exception:
+        logger.exception("Warm-up failed; components will load on first use")
+    _ready = True
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global _ready
+    retention.start()
+    # Warm up in the background so the server listens, and /livez answers, meanwhile.
+    warming = asyncio.create_task(_warm_up())
     yield
+    _ready = False
+    warming.cancel()
+    with suppress(asyncio.CancelledError):
+        await warming
+    retention.stop()
+    ingest_jobs.shutdown()
+    # Durability flush of write-behind messages before the connections go away.
+    cs.flush()
     cs.close()
 
 
@@ -37,6 +90,12 @@ class QuestionRequest(BaseModel):
     conversation_id: int | None = None
 
 
+class BatchQuestionRequest(BaseModel):
+    questions: list[Annotated[str, Field(min_length=1, max_length=2000)]] = Field(
+        ..., min_length=1, max_length=5000
+    )
+
+
 class AnswerResponse(BaseModel):
     answer: str
     sources: list[dict]
@@ -54,6 +113,7 @@ class ConversationResponse(BaseModel):
     created_at: str
     updated_at: str
     message_count: int
+    last_message_at: str | None = None
 
 
 class RenameRequest(BaseModel):
@@ -63,87 +123,152 @@ class RenameRequest(BaseModel):
 # --- Health ---
 
 
+@app.get("/livez")
+async def livez():
+    """Liveness: the process is serving requests."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz(response: Response):
+    """Readiness: started up and not shutting down. Reads in-memory state only."""
+    if not _ready:
+        response.status_code = 503
+    return {"status": "ready" if _ready else "unavailable", "llm": get_llm_provider()}
+
+
+@app.get("/metrics")
+async def metrics():
+    """Latency histograms in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/health")
 def health():
-    try:
-        _, provider = get_llm()
-        llm_status = provider
-    except ConnectionError:
-        llm_status = "disconnected"
-
+    """Status with store statistics, cached until documents are ingested or cleared."""
     return {
         "status": "ok",
-        "llm": llm_status,
-        "documents": get_document_count(),
-        "sources": list_sources(),
+        "llm": get_llm_provider() or "disconnected",
+        **get_store_stats(),
     }
 
 
 # --- Documents ---
 
 
-@app.post("/documents/upload")
-async def upload_document(file: UploadFile):
+@app.post("/documents/upload", status_code=202)
+async def upload_document(file: UploadFile, x_profile: Annotated[str | None, Header()] = None):
+    """Queue a file for ingestion; poll GET /jobs/{job_id} for progress."""
     ext = file.filename.rsplit(".", 1)[-1].lower() if file.filename else ""
     loaders = {"pdf": load_pdf, "txt": load_txt, "docx": load_docx, "csv": load_csv}
     loader = loaders.get(ext)
     if not loader:
         raise HTTPException(400, f"Unsupported file type: .{ext}")
 
-    documents = loader(file)
-    chunks = split_documents(documents)
-    count = add_documents(chunks)
-    return {"filename": file.filename, "chunks": count}
+    upload = ingest_jobs.UploadedFile(file.filename, await file.read())
+    job = ingest_jobs.submit(
+        file.filename, lambda: loader(upload), profile=profiling.should_profile(x_profile)
+    )
+    return {"job_id": job.id, "filename": file.filename, "status": job.status}
 
 
-@app.post("/documents/url")
+@app.post("/documents/url", status_code=202)
 def load_url(req: URLRequest):
-    documents = load_web(req.url)
-    chunks = split_documents(documents)
-    count = add_documents(chunks)
-    return {"url": req.url, "chunks": count}
+    """Queue a web page for ingestion; poll GET /jobs/{job_id} for progress."""
+    job = ingest_jobs.submit(req.url, lambda: load_web(req.url))
+    return {"job_id": job.id, "url": req.url, "status": job.status}
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = ingest_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    return job.to_dict()
 
 
 @app.get("/documents")
 def list_documents():
-    return {"count": get_document_count(), "sources": list_sources()}
+    stats = get_store_stats()
+    return {"count": stats["documents"], "sources": stats["sources"]}
 
 
 @app.delete("/documents")
 def clear_documents():
     clear_store()
-    reset_chain()
     return {"status": "cleared"}
 
 
 # --- Questions ---
 
 
-@app.post("/ask", response_model=AnswerResponse)
-def ask(req: QuestionRequest):
-    if get_document_count() == 0:
+async def _start_turn(req: QuestionRequest) -> tuple[int, list[dict], str | None]:
+    """Validate the store, resolve the conversation and record the user message.
+
+    Returns the conversation ID, the previous turn and the rolling summary of
+    everything before it, so the prompt size does not grow with the conversation.
+    """
+    if await asyncio.to_thread(get_document_count) == 0:
         raise HTTPException(400, "No documents loaded. Upload documents first.")
 
     cid = req.conversation_id
     if cid is None:
-        cid = cs.create_conversation(req.question[:50])
+        cid = await asyncio.to_thread(cs.create_conversation, req.question[:50])
+    elif not await asyncio.to_thread(cs.conversation_exists, cid):
+        raise HTTPException(404, "Conversation not found")
+
+    history = await asyncio.to_thread(
+        cs.get_recent_messages, cid, LAST_TURN_MESSAGES, include_sources=False
+    )
+    summary = await asyncio.to_thread(cs.get_summary, cid)
+    try:
+        await asyncio.to_thread(cs.add_message, cid, "user", req.question)
+    except sqlite3.IntegrityError:
+        # Deleted since the check above.
+        raise HTTPException(404, "Conversation not found") from None
+    return cid, history, summary
 
-    history = cs.get_messages(cid)
-    cs.add_message(cid, "user", req.question)
 
-    start = time.time()
-    result = ask_question(req.question, history)
-    elapsed = time.time() - start
+def _sse(event: str, data: dict) -> str:
+    """Format a single Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-    cs.add_message(cid, "assistant", result["answer"], sources=result["sources"])
 
-    evaluation = evaluate_response(
-        req.question,
-        result["answer"],
-        [],
-        result["sources"],
-        elapsed,
-    )
+@app.post("/ask", response_model=AnswerResponse)
+async def ask(
+    req: QuestionRequest,
+    background_tasks: BackgroundTasks,
+    x_profile: Annotated[str | None, Header()] = None,
+):
+    with profiling.profile_request("ask", x_profile), tracing.trace("POST /ask") as root:
+        with tracing.span("history_load"):
+            cid, history, summary = await _start_turn(req)
+        root.set(conversation_id=cid)
+
+        start = time.time()
+        key = coalescing_key(req.question, history, summary)
+        with tracing.span("answer", cache_hit=_flights.in_flight(key)) as span:
+            result = await _flights.do(key, lambda: aask_question(req.question, history, summary))
+            span.set(k=result.get("k"), prompt_tokens=result.get("prompt_tokens"))
+        elapsed = time.time() - start
+
+        with tracing.span("persistence"):
+            await asyncio.to_thread(
+                cs.add_message, cid, "assistant", result["answer"], sources=result["sources"]
+            )
+        background_tasks.add_task(arefresh_summary, cid)
+
+        with tracing.span("evaluation"):
+            evaluation = await asyncio.to_thread(
+                evaluate_response,
+                req.question,
+                result["answer"],
+                result.get("context_docs", []),
+                result["sources"],
+                elapsed,
+                prompt_tokens=result.get("prompt_tokens"),
+                k=result.get("k"),
+            )
 
     return AnswerResponse(
         answer=result["answer"],
@@ -153,18 +278,150 @@ def ask(req: QuestionRequest):
     )
 
 
+@app.post("/ask/stream")
+async def ask_stream(req: QuestionRequest, request: Request):
+    """Stream an answer as SSE: a sources event, token deltas, then a done event."""
+    turn_start = time.time_ns()
+    cid, history, summary = await _start_turn(req)
+    turn_end = time.time_ns()
+
+    async def events():
+        # The trace opens here because the body streams after the handler has returned.
+        with tracing.trace("POST /ask/stream", start_ns=turn_start, conversation_id=cid):
+            tracing.record_span("history_load", turn_start, turn_end)
+            async for event in _stream_answer():
+                yield event
+
+    async def _stream_answer():
+        start = time.time()
+        answer = ""
+        sources: list[dict] = []
+        context_docs: list = []
+        sent_sources = False
+        key = coalescing_key(req.question, history, summary)
+        with tracing.span("answer", cache_hit=_flights.in_flight(key)) as span:
+            try:
+                shared = _flights.stream(
+                    key, lambda: aask_question_stream(req.question, history, summary)
+                )
+                async with aclosing(shared) as stream:
+                    async for chunk_text, chunk_sources, chunk_context in stream:
+                        if await request.is_disconnected():
+                            logger.info("Client disconnected, cancelling generation for %s", cid)
+                            span.set(disconnected=True)
+                            return
+                        sources = chunk_sources
+                        context_docs = chunk_context
+                        if not sent_sources:
+                            yield _sse("sources", {"conversation_id": cid, "sources": sources})
+                            sent_sources = True
+                        if chunk_text:
+                            answer += chunk_text
+                            yield _sse("token", {"delta": chunk_text})
+            except Exception as e:
+                logger.error("Streaming generation failed: %s", e)
+                span.set(error=str(e))
+                yield _sse("error", {"detail": str(e)})
+                return
+            span.set(k=len(context_docs))
+
+        elapsed = time.time() - start
+        if not sent_sources:
+            yield _sse("sources", {"conversation_id": cid, "sources": sources})
+
+        with tracing.span("persistence"):
+            await asyncio.to_thread(cs.add_message, cid, "assistant", answer, sources=sources)
+        prompt_tokens = estimate_prompt_tokens(req.question, history, context_docs, summary)
+        with tracing.span("evaluation"):
+            evaluation = await asyncio.to_thread(
+                evaluate_response,
+                req.question,
+                answer,
+                context_docs,
+                sources,
+                elapsed,
+                prompt_tokens=prompt_tokens,
+            )
+        yield _sse("done", {"conversation_id": cid, "evaluation": evaluation})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(arefresh_summary, cid),
+    )
+
+
+@app.post("/ask/batch")
+async def ask_batch(req: BatchQuestionRequest):
+    """Answer many questions, streaming one NDJSON result per line as each completes.
+
+    Batch answers are not stored as conversations.
+    """
+    if await asyncio.to_thread(get_document_count) == 0:
+        raise HTTPException(400, "No documents loaded. Upload documents first.")
+
+    async def lines():
+        try:
+            async with aclosing(ask_questions(req.questions)) as results:
+                async for result in results:
+                    yield json.dumps(result) + "\n"
+        except Exception as e:
+            logger.error("Batch answering failed: %s", e)
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 # --- Conversations ---
 
 
 @app.get("/conversations", response_model=list[ConversationResponse])
-def list_conversations():
-    return cs.list_conversations()
+def list_conversations(
+    response: Response,
+    cursor: int | None = None,
+    limit: int = Query(50, ge=1, le=200),
+):
+    """List conversations, most recent first; the next page's cursor is in X-Next-Cursor."""
+    conversations = cs.list_conversations(limit=limit, before=cursor)
+    if len(conversations) == limit:
+        response.headers["X-Next-Cursor"] = str(conversations[-1]["updated_seq"])
+    return conversations
+
+
+@app.get("/conversations/search")
+def search_conversations(
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, lt=cs.SEARCH_CANDIDATES),
+):
+    """Full-text search across all messages, best matches first, with highlighted snippets.
+
+    Only the newest SEARCH_CANDIDATES matches are ranked and paged through;
+    ``truncated`` is true when older matches were left out.
+    """
+    results = cs.search_messages(q, limit=limit, offset=offset)
+    next_offset = offset + limit
+    if len(results) < limit or next_offset >= cs.SEARCH_CANDIDATES:
+        next_offset = None
+    return {
+        "query": q,
+        "results": results,
+        "next_offset": next_offset,
+        "truncated": cs.search_truncated(q),
+    }
 
 
 @app.get("/conversations/{cid}/messages")
-def get_messages(cid: int):
-    messages = cs.get_messages(cid)
-    return {"conversation_id": cid, "messages": messages}
+def get_messages(
+    cid: int,
+    after: int | None = None,
+    limit: int = Query(100, ge=1, le=500),
+    include_sources: bool = True,
+):
+    messages = cs.list_messages(cid, after_id=after, limit=limit, include_sources=include_sources)
+    next_cursor = messages[-1]["id"] if len(messages) == limit else None
+    return {"conversation_id": cid, "messages": messages, "next_cursor": next_cursor}
 
 
 @app.patch("/conversations/{cid}")
@@ -179,13 +436,29 @@ def delete_conversation(cid: int):
     return {"status": "deleted"}
 
 
+# --- Admin ---
+
+
+@app.get("/admin/profiles")
+def list_profiles():
+    """Profiles captured with PROFILING_ENABLED, newest first."""
+    return profiling.list_profiles()
+
+
+@app.get("/admin/profiles/{name}")
+def download_profile(name: str):
+    path = profiling.get_profile_path(name)
+    if path is None:
+        raise HTTPException(404, "Profile not found")
+    return FileResponse(path, filename=name, media_type="application/octet-stream")
+
+
 # --- LLM ---
 
 
 @app.post("/llm/reconnect")
 def reconnect_llm():
     reset_llm()
-    reset_chain()
     try:
         _, provider = get_llm()
         return {"status": "connected", "provider": provider}
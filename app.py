@@ -5,14 +5,14 @@ import streamlit as st
 from src.document_loader import load_csv, load_docx, load_pdf, load_txt, load_web
 from src.evaluation import evaluate_response
 from src.llm import get_llm, reset_llm
-from src.rag_chain import ask_question_stream, reset_chain
+from src.rag_chain import ask_question_stream, estimate_prompt_tokens
 from src.styles import CUSTOM_CSS, get_metrics_html, get_source_card_html
 from src.text_splitter import split_documents
 from src.vector_store import (
     add_documents,
     clear_store,
     get_document_count,
-    list_sources,
+    get_store_stats,
 )
 
 # --- Page Config ---
@@ -93,7 +93,6 @@ with st.sidebar:
                         chunks = split_documents(docs)
                         num_chunks = add_documents(chunks)
                         st.session_state.processed_files.add(file_id)
-                        reset_chain()
                         st.success(f"✅ {uploaded_file.name}: {num_chunks} chunks")
                     except Exception as e:
                         st.error(f"❌ {uploaded_file.name}: {e}")
@@ -109,7 +108,6 @@ with st.sidebar:
                 docs = load_web(url)
                 chunks = split_documents(docs)
                 num_chunks = add_documents(chunks)
-                reset_chain()
                 st.success(f"✅ Loaded: {num_chunks} chunks")
             except Exception as e:
                 st.error(f"❌ Error: {e}")
@@ -118,10 +116,11 @@ with st.sidebar:
 
     # Document Info
     st.markdown("### 📊 Loaded Documents")
-    doc_count = get_document_count()
+    stats = get_store_stats()
+    doc_count = stats["documents"]
     st.metric("Total Chunks", doc_count)
 
-    sources = list_sources()
+    sources = stats["sources"]
     if sources:
         for source in sources:
             st.text(f"  • {source}")
@@ -133,7 +132,6 @@ with st.sidebar:
     # Clear All
     if st.button("🗑️ Clear All Documents", type="secondary"):
         clear_store()
-        reset_chain()
         st.session_state.processed_files.clear()
         st.session_state.chat_history.clear()
         st.session_state.eval_results.clear()
@@ -212,7 +210,14 @@ with tab_chat:
 
                     # Evaluate response
                     metrics = evaluate_response(
-                        prompt, full_answer, context_docs, sources, response_time
+                        prompt,
+                        full_answer,
+                        context_docs,
+                        sources,
+                        response_time,
+                        prompt_tokens=estimate_prompt_tokens(
+                            prompt, st.session_state.chat_history, context_docs
+                        ),
                     )
 
                     # Display metrics
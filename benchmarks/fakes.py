@@ -0,0 +1,164 @@
+"""Deterministic offline stand-ins for the embedding model and the LLM.
+
+``offline_environment`` points every module singleton (embeddings, Chroma
+directory, LLM, conversation database) at these fakes and a scratch directory,
+so benchmarks and load tests exercise the real code paths without network or
+model downloads.
+"""
+
+import hashlib
+import math
+import random
+import re
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from unittest.mock import patch
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import FakeListChatModel
+
+from src import conversation_store as cs
+from src import document_loader, embeddings, llm, rag_chain, summarizer, vector_store, warmup
+
+EMBEDDING_SIZE = 384
+FAKE_ANSWER = (
+    "Based on the context, the system stores documents as overlapping chunks and "
+    "retrieves the most relevant ones for each question."
+)
+_WORD = re.compile(r"\w+")
+
+VOCABULARY = [
+    "retrieval",
+    "embedding",
+    "vector",
+    "chunk",
+    "document",
+    "index",
+    "query",
+    "answer",
+    "context",
+    "prompt",
+    "model",
+    "latency",
+    "throughput",
+    "cache",
+    "token",
+    "stream",
+    "batch",
+    "database",
+    "conversation",
+    "summary",
+    "score",
+    "policy",
+    "invoice",
+    "refund",
+    "account",
+    "billing",
+    "deploy",
+    "cluster",
+    "network",
+    "storage",
+    "backup",
+    "security",
+    "access",
+    "audit",
+    "report",
+    "metric",
+    "alert",
+    "incident",
+    "release",
+    "version",
+    "schema",
+    "migration",
+    "pipeline",
+    "worker",
+    "queue",
+    "request",
+    "response",
+    "timeout",
+    "retry",
+    "limit",
+    "budget",
+]
+
+
+class HashEmbeddings(Embeddings):
+    """Bag-of-words feature hashing: similar texts get similar unit vectors."""
+
+    def __init__(self, size: int = EMBEDDING_SIZE):
+        self.size = size
+
+    def _embed(self, text: str) -> list[float]:
+        vector = [0.0] * self.size
+        for word in _WORD.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.size
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+def fake_llm(answer: str = FAKE_ANSWER, token_delay: float = 0.0) -> FakeListChatModel:
+    """Chat model that always answers with `answer`, streaming one character at a time."""
+    return FakeListChatModel(responses=[answer], sleep=token_delay or None)
+
+
+def synthetic_documents(count: int, words: int = 800, seed: int = 0) -> list[Document]:
+    """Reproducible documents of random vocabulary words."""
+    rng = random.Random(seed)
+    documents = []
+    for i in range(count):
+        sentences = []
+        remaining = words
+        while remaining > 0:
+            length = min(rng.randint(8, 20), remaining)
+            sentences.append(" ".join(rng.choices(VOCABULARY, k=length)).capitalize() + ".")
+            remaining -= length
+        documents.append(
+            Document(
+                page_content=" ".join(sentences),
+                metadata={"source_type": "txt", "filename": f"doc{i}.txt"},
+            )
+        )
+    return documents
+
+
+def synthetic_questions(count: int, seed: int = 1) -> list[str]:
+    """Reproducible questions over the synthetic vocabulary."""
+    rng = random.Random(seed)
+    return [
+        f"How does the {rng.choice(VOCABULARY)} {rng.choice(VOCABULARY)} affect "
+        f"{rng.choice(VOCABULARY)}?"
+        for _ in range(count)
+    ]
+
+
+@contextmanager
+def offline_environment(workdir: Path, answer: str = FAKE_ANSWER, token_delay: float = 0.0):
+    """Run the app's modules against fakes and a scratch directory."""
+    workdir = Path(workdir)
+    cs.close()
+    rag_chain.reset_chain()
+    with ExitStack() as stack:
+        stack.enter_context(patch.object(embeddings, "_embeddings", HashEmbeddings()))
+        stack.enter_context(patch.object(vector_store, "_vector_store", None))
+        stack.enter_context(patch.object(vector_store, "CHROMA_DB_DIR", str(workdir / "chroma")))
+        stack.enter_context(patch.object(llm, "_llm", fake_llm(answer, token_delay)))
+        stack.enter_context(patch.object(llm, "_llm_provider", "fake"))
+        # Modules that imported get_llm by name keep whatever was bound at import.
+        for module in (rag_chain, summarizer, warmup):
+            stack.enter_context(patch.object(module, "get_llm", llm.get_llm))
+        stack.enter_context(patch.object(cs, "DB_PATH", workdir / "conversations.db"))
+        stack.enter_context(patch.object(document_loader, "DATA_DIR", str(workdir / "uploads")))
+        try:
+            yield
+        finally:
+            cs.close()
+            rag_chain.reset_chain()
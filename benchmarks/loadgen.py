@@ -0,0 +1,350 @@
+"""Load generator for the REST API.
+
+Usage:
+    python -m benchmarks.loadgen --concurrency 8 --duration 30
+    python -m benchmarks.loadgen --rate 20 --requests 500 --mix ask=0.6,stream=0.3,upload=0.1
+    python -m benchmarks.loadgen --questions queries.txt --url http://localhost:8000
+
+Without --url, api.py is served in-process by uvicorn with the offline fakes
+from benchmarks.fakes and a seeded synthetic corpus, so the numbers measure the
+application rather than the models. Questions are replayed from --questions (one
+per line, JSON lines with a "question" field, or a retention archive segment)
+or synthesized from the corpus.
+
+--concurrency runs a closed loop of that many clients; --rate sends Poisson
+arrivals at that many requests per second regardless of how fast they finish.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+import uvicorn
+
+from benchmarks.fakes import offline_environment, synthetic_documents, synthetic_questions
+from src import llm
+from src.retention import read_segment
+from src.text_splitter import split_documents
+from src.vector_store import add_documents
+
+OPERATIONS = ("ask", "stream", "upload")
+DEFAULT_MIX = "ask=0.7,stream=0.25,upload=0.05"
+# How often an upload's ingestion job is polled until it finishes.
+JOB_POLL_INTERVAL = 0.05
+
+
+@dataclass
+class Sample:
+    """Outcome of one request."""
+
+    operation: str
+    start: float
+    latency: float
+    ok: bool
+    ttft: float | None = None
+    error: str | None = None
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    """Parse ``ask=0.7,upload=0.3`` into normalized operation weights."""
+    weights = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name!r}; expected one of {OPERATIONS}")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("Operation weights must add up to more than zero")
+    return {name: weight / total for name, weight in weights.items() if weight > 0}
+
+
+def load_questions(path: Path) -> list[str]:
+    """Questions from a text file, JSON lines with a "question" field, or an archive segment."""
+    if path.name.endswith(".ndjson.gz"):
+        return [
+            message["content"]
+            for conversation in read_segment(path)
+            for message in conversation["messages"]
+            if message["role"] == "user"
+        ]
+    questions = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line.startswith("{"):
+            line = json.loads(line).get("question", "")
+        if line:
+            questions.append(line)
+    return questions
+
+
+def questions_from_corpus(texts: list[str], count: int, seed: int = 2) -> list[str]:
+    """Questions about phrases drawn from the corpus, so retrieval finds matching chunks."""
+    rng = random.Random(seed)
+    questions = []
+    for _ in range(count):
+        words = rng.choice(texts).split()
+        start = rng.randrange(max(1, len(words) - 4))
+        phrase = " ".join(words[start : start + 4]).strip(".").lower()
+        questions.append(f"What does the documentation say about {phrase}?")
+    return questions
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def _latency_stats(values: list[float]) -> dict:
+    ordered = sorted(values)
+    return {f"p{q}_ms": round(percentile(ordered, q) * 1000, 1) for q in (50, 95, 99)}
+
+
+def summarize(samples: list[Sample], elapsed: float) -> dict:
+    """Latency percentiles, time to first token, error rate and throughput per operation."""
+    groups = defaultdict(list)
+    for sample in samples:
+        groups[sample.operation].append(sample)
+    report = {}
+    for operation, group in sorted(groups.items()) + [("all", samples)]:
+        if not group:
+            continue
+        errors = [s for s in group if not s.ok]
+        stats = {
+            "requests": len(group),
+            "errors": len(errors),
+            "error_rate": round(len(errors) / len(group), 4),
+            "throughput_rps": round((len(group) - len(errors)) / elapsed, 2),
+            **_latency_stats([s.latency for s in group]),
+        }
+        ttfts = [s.ttft for s in group if s.ttft is not None]
+        if ttfts:
+            stats["ttft"] = _latency_stats(ttfts)
+        if errors:
+            stats["sample_error"] = errors[0].error
+        report[operation] = stats
+    return report
+
+
+class LoadGenerator:
+    """Issues a weighted mix of /ask, /ask/stream and upload requests."""
+
+    def __init__(self, client: httpx.AsyncClient, questions: list[str], mix: dict, seed: int = 0):
+        self.client = client
+        self.questions = questions
+        self.rng = random.Random(seed)
+        self.operations = list(mix)
+        self.weights = list(mix.values())
+        self.samples: list[Sample] = []
+        self._uploads = 0
+
+    async def one(self) -> None:
+        operation = self.rng.choices(self.operations, self.weights)[0]
+        question = self.rng.choice(self.questions)
+        start = time.perf_counter()
+        ttft = None
+        try:
+            if operation == "ask":
+                response = await self.client.post("/ask", json={"question": question})
+                response.raise_for_status()
+            elif operation == "stream":
+                ttft = await self._stream(question, start)
+            else:
+                await self._upload()
+            self.samples.append(Sample(operation, start, time.perf_counter() - start, True, ttft))
+        except Exception as e:
+            self.samples.append(
+                Sample(
+                    operation, start, time.perf_counter() - start, False, ttft, str(e) or repr(e)
+                )
+            )
+
+    async def _stream(self, question: str, start: float) -> float | None:
+        ttft = None
+        event = None
+        async with self.client.stream(
+            "POST", "/ask/stream", json={"question": question}
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[7:]
+                    if event == "token" and ttft is None:
+                        ttft = time.perf_counter() - start
+                elif line.startswith("data: ") and event == "error":
+                    raise RuntimeError(json.loads(line[6:])["detail"])
+        if event != "done":
+            raise RuntimeError(f"Stream ended after {event!r} event")
+        return ttft
+
+    async def _upload(self) -> None:
+        self._uploads += 1
+        name = f"loadgen-{self._uploads}.txt"
+        (document,) = synthetic_documents(1, words=400, seed=self.rng.randrange(1 << 30))
+        response = await self.client.post(
+            "/documents/upload",
+            files={"file": (name, document.page_content.encode(), "text/plain")},
+        )
+        response.raise_for_status()
+        job_id = response.json()["job_id"]
+        while True:
+            job = (await self.client.get(f"/jobs/{job_id}")).raise_for_status().json()
+            if job["status"] == "done":
+                return
+            if job["status"] == "failed":
+                raise RuntimeError(f"Ingestion failed: {job['error']}")
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+    async def closed_loop(self, concurrency: int, requests: int, duration: float | None) -> None:
+        """Keep `concurrency` requests in flight until the request count or duration is reached."""
+        deadline = time.perf_counter() + duration if duration else None
+        remaining = requests
+
+        async def client():
+            nonlocal remaining
+            while deadline is None or time.perf_counter() < deadline:
+                if deadline is None:
+                    if remaining <= 0:
+                        return
+                    remaining -= 1
+                await self.one()
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+
+    async def open_loop(self, rate: float, requests: int, duration: float | None) -> None:
+        """Start requests as a Poisson process at `rate` per second, however long they take."""
+        deadline = time.perf_counter() + duration if duration else None
+        tasks = []
+        next_at = time.perf_counter()
+        while (deadline is None and len(tasks) < requests) or (
+            deadline is not None and next_at < deadline
+        ):
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            tasks.append(asyncio.create_task(self.one()))
+            next_at += self.rng.expovariate(rate)
+        await asyncio.gather(*tasks)
+
+
+@contextmanager
+def local_server(workdir: Path, corpus_documents: int, token_delay: float):
+    """Serve api.py on a free local port with the offline fakes and a seeded corpus.
+
+    Yields the base URL and the corpus chunk texts.
+    """
+    import api
+
+    with offline_environment(workdir, token_delay=token_delay):
+        chunks = split_documents(synthetic_documents(corpus_documents))
+        add_documents(chunks)
+
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        host, port = sock.getsockname()
+        server = uvicorn.Server(uvicorn.Config(api.app, log_level="warning", lifespan="on"))
+        thread = threading.Thread(
+            target=server.run, kwargs={"sockets": [sock]}, name="loadgen-server", daemon=True
+        )
+        with patch.object(api, "get_llm", llm.get_llm):
+            thread.start()
+            try:
+                url = f"http://{host}:{port}"
+                # Warm-up runs after the server starts listening, so wait for /readyz.
+                while not server.started or httpx.get(f"{url}/readyz").status_code != 200:
+                    if not thread.is_alive():
+                        raise RuntimeError("Local API server failed to start")
+                    time.sleep(0.01)
+                yield url, [c.page_content for c in chunks]
+            finally:
+                server.should_exit = True
+                thread.join()
+                sock.close()
+
+
+async def drive(url: str, questions: list[str], args) -> dict:
+    """Run the configured load against `url` and summarize it."""
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        generator = LoadGenerator(client, questions, parse_mix(args.mix), seed=args.seed)
+        start = time.perf_counter()
+        if args.rate:
+            await generator.open_loop(args.rate, args.requests, args.duration)
+        else:
+            await generator.closed_loop(args.concurrency, args.requests, args.duration)
+        elapsed = time.perf_counter() - start
+    return {
+        "config": {
+            "url": args.url or "in-process",
+            "mix": parse_mix(args.mix),
+            "rate": args.rate,
+            "concurrency": None if args.rate else args.concurrency,
+            "elapsed_s": round(elapsed, 2),
+        },
+        "results": summarize(generator.samples, elapsed),
+    }
+
+
+def _print_report(report: dict) -> None:
+    print(
+        f"{'operation':<10} {'reqs':>6} {'err %':>6} {'req/s':>7} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ttft p50':>9} {'ttft p95':>9}"
+    )
+    for operation, s in report["results"].items():
+        ttft = s.get("ttft", {})
+        print(
+            f"{operation:<10} {s['requests']:>6} {s['error_rate'] * 100:>6.1f} "
+            f"{s['throughput_rps']:>7} {s['p50_ms']:>8} {s['p95_ms']:>8} {s['p99_ms']:>8} "
+            f"{ttft.get('p50_ms', '-'):>9} {ttft.get('p95_ms', '-'):>9}"
+        )
+        if "sample_error" in s:
+            print(f"  e.g. {s['sample_error']}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=4, help="clients in a closed loop")
+    load.add_argument("--rate", type=float, help="Poisson arrivals per second (open loop)")
+    parser.add_argument("--requests", type=int, default=200, help="requests to send")
+    parser.add_argument("--duration", type=float, help="seconds to run; overrides --requests")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="weights of ask, stream and upload")
+    parser.add_argument("--questions", type=Path, help="questions to replay")
+    parser.add_argument("--url", help="target a running API instead of an in-process one")
+    parser.add_argument("--corpus-documents", type=int, default=50)
+    parser.add_argument("--token-delay", type=float, default=0.0, help="fake LLM seconds/token")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="write the report JSON here")
+    args = parser.parse_args(argv)
+    parse_mix(args.mix)
+
+    questions = load_questions(args.questions) if args.questions else None
+    if args.url:
+        report = asyncio.run(drive(args.url, questions or synthetic_questions(100), args))
+    else:
+        with (
+            tempfile.TemporaryDirectory(prefix="loadgen-") as workdir,
+            local_server(Path(workdir), args.corpus_documents, args.token_delay) as (url, texts),
+        ):
+            report = asyncio.run(drive(url, questions or questions_from_corpus(texts, 100), args))
+
+    _print_report(report)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+    return 1 if report["results"]["all"]["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,308 @@
+"""Offline benchmark suite for ingestion, search, answering and conversation storage.
+
+Usage:
+    python -m benchmarks.run                          # default corpus sizes
+    python -m benchmarks.run --sizes 100 1000 --output results.json
+    python -m benchmarks.run --compare baseline.json  # exit 1 on regressions
+
+Every scenario runs against the real modules, with the deterministic hash
+embedding and fake LLM from benchmarks.fakes, in a scratch directory per corpus
+size. Results are keyed ``<scenario>@<size>`` with latency statistics in ms.
+Import times are measured in fresh interpreters and keyed ``import:<module>``.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from benchmarks.fakes import offline_environment, synthetic_documents, synthetic_questions
+from src import conversation_store as cs
+from src.evaluation import evaluate_response
+from src.rag_chain import ask_question
+from src.text_splitter import split_documents
+from src.vector_store import add_documents, get_vector_store, search
+
+DEFAULT_SIZES = (200, 1000)
+DEFAULT_THRESHOLD = 0.25
+# Chunks per synthetic document at the default CHUNK_SIZE.
+CHUNKS_PER_DOCUMENT = 6
+ROOT = Path(__file__).resolve().parent.parent
+# Extra result fields shown in the printed table.
+NOTE_FIELDS = ("chunks_per_s", "commits_per_request", "heavy_modules")
+# Conversations the /ask scenarios rotate through, so most requests are follow-ups.
+ASK_CONVERSATIONS = 4
+# Modules whose cold import time is measured.
+IMPORT_MODULES = (
+    "api",
+    "src.rag_chain",
+    "src.vector_store",
+    "src.embeddings",
+    "src.document_loader",
+    "src.conversation_store",
+)
+# Dependencies that should only be imported on first use, not by importing IMPORT_MODULES.
+HEAVY_MODULES = (
+    "torch",
+    "sentence_transformers",
+    "chromadb",
+    "langchain_chroma",
+    "langchain_community",
+    "langchain_huggingface",
+    "langchain_classic",
+)
+_IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+__import__(sys.argv[1])
+seconds = time.perf_counter() - start
+print(json.dumps([seconds, [m for m in sys.argv[2:] if m in sys.modules]]))
+"""
+
+
+def summarize(samples: list[float], **extra) -> dict:
+    """Latency statistics in milliseconds for per-operation samples in seconds."""
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))]
+    return {
+        "n": len(samples),
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(p95 * 1000, 3),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+        **extra,
+    }
+
+
+def timed(func, *args, **kwargs):
+    """Call func, returning (result, seconds)."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def repeat(func, times: int) -> list[float]:
+    """Durations of `times` calls of func(i)."""
+    return [timed(func, i)[1] for i in range(times)]
+
+
+def measure_import(module: str, times: int = 3) -> dict:
+    """Time importing `module` in fresh interpreters, noting heavy dependencies it loads."""
+    samples = []
+    for _ in range(times):
+        probe = subprocess.run(
+            [sys.executable, "-c", _IMPORT_PROBE, module, *HEAVY_MODULES],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        seconds, heavy = json.loads(probe.stdout.splitlines()[-1])
+        samples.append(seconds)
+    return summarize(samples, heavy_modules=heavy)
+
+
+def bench_corpus(size: int, queries: int, workdir: Path) -> dict:
+    """Run every scenario against a corpus of about `size` chunks."""
+    results = {}
+    documents = synthetic_documents(max(1, size // CHUNKS_PER_DOCUMENT), seed=size)
+    questions = synthetic_questions(queries)
+
+    with offline_environment(workdir):
+        splits = [timed(split_documents, documents) for _ in range(3)]
+        chunks = splits[0][0]
+        results["split_documents"] = summarize([s for _, s in splits], chunks=len(chunks))
+
+        get_vector_store()  # Open the store outside the measurement.
+        _, seconds = timed(add_documents, chunks)
+        results["add_documents"] = summarize(
+            [seconds], chunks=len(chunks), chunks_per_s=round(len(chunks) / seconds, 1)
+        )
+
+        results["search"] = summarize(repeat(lambda i: search(questions[i]), queries))
+
+        answers = []
+
+        def ask(i):
+            answers.append(ask_question(questions[i]))
+
+        ask(0)  # Build the chain outside the measurement.
+        answers.clear()
+        results["ask_question"] = summarize(repeat(ask, queries))
+
+        results["evaluate_response"] = summarize(
+            repeat(
+                lambda i: evaluate_response(
+                    questions[i],
+                    answers[i]["answer"],
+                    answers[i]["context_docs"],
+                    answers[i]["sources"],
+                    0.0,
+                ),
+                queries,
+            )
+        )
+
+        results.update(bench_ask_api(questions))
+        results.update(bench_conversation_store(size, answers[0]["sources"]))
+    return results
+
+
+def _ask_requests(client: TestClient, questions: list[str]) -> list[float]:
+    """Durations of POST /ask for each question, rotating through a few conversations."""
+    conversations: list[int] = []
+
+    def ask(i):
+        body = {"question": questions[i]}
+        if len(conversations) == ASK_CONVERSATIONS:
+            body["conversation_id"] = conversations[i % ASK_CONVERSATIONS]
+        response = client.post("/ask", json=body)
+        response.raise_for_status()
+        if len(conversations) < ASK_CONVERSATIONS:
+            conversations.append(response.json()["conversation_id"])
+
+    return repeat(ask, len(questions))
+
+
+def bench_ask_api(questions: list[str]) -> dict:
+    """Time POST /ask through the app, counting SQLite commits per request.
+
+    Runs once with synchronous message writes and once with write-behind, each
+    including the summary refresh that runs after every answer.
+    """
+    import api
+
+    client = TestClient(api.app)
+    results = {}
+    for scenario, write_behind in (("ask_api", False), ("ask_api_write_behind", True)):
+        with patch.object(cs, "WRITE_BEHIND", write_behind):
+            start = cs._commit_count
+            samples = _ask_requests(client, questions)
+            cs.flush()
+            commits = cs._commit_count - start
+        results[scenario] = summarize(
+            samples, commits_per_request=round(commits / len(questions), 2)
+        )
+    return results
+
+
+def bench_conversation_store(size: int, sources: list[dict]) -> dict:
+    """Time the conversation store's hot operations with `size` messages."""
+    conversations = max(1, size // 20)
+    ids = [cs.create_conversation(f"Chat {i}") for i in range(conversations)]
+
+    def add(i):
+        role = "user" if i % 2 == 0 else "assistant"
+        cs.add_message(ids[i % conversations], role, f"Message {i} about retrieval", sources)
+
+    results = {"add_message": summarize(repeat(add, size))}
+    reads = min(size, 200)
+    results["get_recent_messages"] = summarize(
+        repeat(lambda i: cs.get_recent_messages(ids[i % conversations], 2), reads)
+    )
+    results["list_messages"] = summarize(
+        repeat(lambda i: cs.list_messages(ids[i % conversations], limit=100), reads)
+    )
+    results["list_conversations"] = summarize(
+        repeat(lambda i: cs.list_conversations(limit=50), reads)
+    )
+    results["search_messages"] = summarize(
+        repeat(lambda i: cs.search_messages("retrieval", limit=20), reads)
+    )
+    return results
+
+
+def run(sizes, queries: int, import_repeat: int = 3) -> dict:
+    """Run the suite for each corpus size, after the import-time benchmarks."""
+    results = {}
+    if import_repeat:
+        for module in IMPORT_MODULES:
+            results[f"import:{module}"] = measure_import(module, import_repeat)
+    for size in sizes:
+        with tempfile.TemporaryDirectory(prefix=f"bench-{size}-") as workdir:
+            for scenario, stats in bench_corpus(size, queries, Path(workdir)).items():
+                results[f"{scenario}@{size}"] = stats
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": list(sizes),
+            "queries": queries,
+            "import_repeat": import_repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list[dict]:
+    """Scenarios whose median latency grew by more than `threshold` over the baseline."""
+    regressions = []
+    for key, stats in current["results"].items():
+        before = baseline["results"].get(key)
+        if not before or not before.get("median_ms"):
+            continue
+        ratio = stats["median_ms"] / before["median_ms"]
+        if ratio > 1 + threshold:
+            regressions.append(
+                {
+                    "scenario": key,
+                    "baseline_ms": before["median_ms"],
+                    "current_ms": stats["median_ms"],
+                    "ratio": round(ratio, 2),
+                }
+            )
+    return regressions
+
+
+def _print_table(results: dict) -> None:
+    width = max(len(key) for key in results)
+    print(f"{'scenario':<{width}}  {'n':>5}  {'median ms':>10}  {'p95 ms':>10}  notes")
+    for key, stats in results.items():
+        notes = ", ".join(f"{k}={v}" for k, v in stats.items() if k in NOTE_FIELDS)
+        print(
+            f"{key:<{width}}  {stats['n']:>5}  {stats['median_ms']:>10}  {stats['p95_ms']:>10}"
+            f"  {notes}"
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--queries", type=int, default=20, help="questions per scenario")
+    parser.add_argument("--output", type=Path, help="write results JSON here")
+    parser.add_argument("--compare", type=Path, help="baseline results JSON to compare with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument(
+        "--import-repeat", type=int, default=3, help="fresh interpreters per import (0 skips)"
+    )
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.queries, args.import_repeat)
+    _print_table(report["results"])
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.compare:
+        regressions = compare(report, json.loads(args.compare.read_text()), args.threshold)
+        for r in regressions:
+            print(
+                f"REGRESSION {r['scenario']}: {r['baseline_ms']} ms -> {r['current_ms']} ms "
+                f"({r['ratio']}x)"
+            )
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
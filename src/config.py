@@ -21,6 +21,51 @@ CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
 
 # RAG
 TOP_K_RESULTS = int(os.getenv("TOP_K_RESULTS", "3"))
+# Adaptive retrieval: fetch up to RETRIEVAL_MAX_K chunks, then stop at the first
+# one below RETRIEVAL_MIN_SCORE or more than RETRIEVAL_SCORE_GAP below its predecessor.
+RETRIEVAL_MAX_K = int(os.getenv("RETRIEVAL_MAX_K", "6"))
+RETRIEVAL_MIN_K = int(os.getenv("RETRIEVAL_MIN_K", "1"))
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.3"))
+RETRIEVAL_SCORE_GAP = float(os.getenv("RETRIEVAL_SCORE_GAP", "0.15"))
+# Attach each retrieved chunk's stored embedding to its metadata.
+RETRIEVAL_INCLUDE_EMBEDDINGS = os.getenv("RETRIEVAL_INCLUDE_EMBEDDINGS", "false").lower() == "true"
+# Estimated prompt tokens for system prompt, history, question and context. Ollama
+# runs with num_ctx=2048 and num_predict=256, leaving 1792; the rest is a margin
+# for the character-based estimate undercounting.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1280"))
+# Generations in flight at once for POST /ask/batch.
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+# Size cap for the rolling conversation summary carried in the prompt.
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "200"))
+
+# Ingestion jobs running at once, and chunks embedded per progress step.
+INGEST_MAX_CONCURRENCY = int(os.getenv("INGEST_MAX_CONCURRENCY", "1"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+
+# Fraction of /ask and /ask/stream requests traced to DATA_DIR/traces/spans.jsonl (0 disables tracing),
+# and the size at which that file is rotated.
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_FILE_MAX_MB = int(os.getenv("TRACE_FILE_MAX_MB", "10"))
+
+# Profile single requests sent with an X-Profile header, or a sampled fraction of them.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+# Load and exercise the embedding model, vector store and LLM before /readyz reports ready.
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+
+# Conversation store: queue add_message writes and commit them in groups
+CONVERSATION_WRITE_BEHIND = os.getenv("CONVERSATION_WRITE_BEHIND", "false").lower() == "true"
+WRITE_BEHIND_INTERVAL_MS = int(os.getenv("WRITE_BEHIND_INTERVAL_MS", "50"))
+WRITE_BEHIND_MAX_BATCH = int(os.getenv("WRITE_BEHIND_MAX_BATCH", "256"))
+
+# Conversation retention: archive and delete conversations inactive for more than
+# RETENTION_MAX_AGE_DAYS, or the oldest ones while the database exceeds
+# RETENTION_MAX_DB_MB (0 disables a policy), every RETENTION_INTERVAL_MINUTES.
+RETENTION_MAX_AGE_DAYS = int(os.getenv("RETENTION_MAX_AGE_DAYS", "0"))
+RETENTION_MAX_DB_MB = int(os.getenv("RETENTION_MAX_DB_MB", "0"))
+RETENTION_INTERVAL_MINUTES = int(os.getenv("RETENTION_INTERVAL_MINUTES", "60"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "100"))
 
 # Paths
 CHROMA_DB_DIR = os.getenv("CHROMA_DB_DIR", "chroma_db")
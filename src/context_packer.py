@@ -0,0 +1,64 @@
+"""Token-budgeted packing of retrieved chunks into the prompt context.
+
+Token counts are estimated from the length of the text rather than counted with
+the model's tokenizer, so budgets passed in here should leave a margin for the
+estimate running low.
+"""
+
+import math
+import re
+
+from langchain_core.documents import Document
+
+# Rough average for English text with Llama/Mistral-style tokenizers.
+CHARS_PER_TOKEN = 4
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text):
+    """Estimate the number of tokens in a piece of text from its length.
+
+    Close for English prose; code, numbers and non-English text can take more.
+    """
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def trim_to_sentences(text, max_tokens):
+    """Keep as many leading whole sentences of text as fit in max_tokens."""
+    kept = ""
+    for sentence in _SENTENCE_END.split(text.strip()):
+        candidate = f"{kept} {sentence}" if kept else sentence
+        if estimate_tokens(candidate) > max_tokens:
+            break
+        kept = candidate
+    return kept
+
+
+def pack_documents(documents, budget):
+    """Fit the highest-scoring documents into a token budget.
+
+    Documents are ranked by their ``score`` metadata when present, otherwise
+    retrieval order is kept. A document that does not fit whole is trimmed to
+    the sentences that do; trimmed copies are flagged with ``truncated``.
+    """
+    ranked = sorted(documents, key=lambda doc: -doc.metadata.get("score", 0.0))
+    packed = []
+    remaining = budget
+    for doc in ranked:
+        if remaining <= 0:
+            break
+        tokens = estimate_tokens(doc.page_content)
+        if tokens <= remaining:
+            packed.append(doc)
+            remaining -= tokens
+            continue
+        trimmed = trim_to_sentences(doc.page_content, remaining)
+        if trimmed:
+            packed.append(
+                Document(page_content=trimmed, metadata={**doc.metadata, "truncated": True})
+            )
+            remaining -= estimate_tokens(trimmed)
+    return packed
@@ -1,147 +1,888 @@
-"""Persistent conversation storage using SQLite."""
+"""Persistent conversation storage using SQLite.
 
+Reads use one connection per thread; all writes go through a single connection
+serialized by a lock, each in its own ``BEGIN IMMEDIATE`` transaction that is
+retried while another process holds the database lock.
+
+With write-behind enabled, add_message only queues the message; a background
+thread writes queued messages in grouped transactions. Reading a conversation's
+messages first flushes that conversation's queue, if it has one, so callers see
+their own messages; other conversations stay queued. Listing and search see
+queued messages once they are flushed, within WRITE_BEHIND_INTERVAL_MS.
+"""
+
+import hashlib
 import json
 import logging
 import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from collections.abc import Callable
 from pathlib import Path
+from typing import TypeVar
 
-from src.config import DATA_DIR
+from src.config import (
+    CONVERSATION_WRITE_BEHIND,
+    DATA_DIR,
+    WRITE_BEHIND_INTERVAL_MS,
+    WRITE_BEHIND_MAX_BATCH,
+)
+from src.metrics import SQLITE_SECONDS
 
 logger = logging.getLogger(__name__)
 
 DB_PATH = Path(DATA_DIR) / "conversations.db"
 
+BUSY_TIMEOUT_MS = 5000
+WRITE_RETRIES = 5
+WRITE_RETRY_BACKOFF = 0.05
+WRITE_BEHIND = CONVERSATION_WRITE_BEHIND
+ROLES = ("user", "assistant")
+# Stored payloads at least this large are zlib-compressed.
+COMPRESS_MIN_BYTES = 512
+# Most recent full-text matches considered for ranking by search_messages.
+SEARCH_CANDIDATES = 1000
+
+T = TypeVar("T")
+
+# Next value of the per-write activity sequence; cheap via idx_conversations_recent.
+_NEXT_SEQ = "(SELECT COALESCE(MAX(updated_seq), 0) + 1 FROM conversations)"
+
+# Writer connection; also used for schema setup.
 _conn: sqlite3.Connection | None = None
+_write_lock = threading.RLock()
+# Per-thread read connections, tagged with the generation they were opened in so
+# that close() invalidates them for every thread.
+_local = threading.local()
+_generation = 0
+_readers: list[sqlite3.Connection] = []
+_commit_count = 0
+
+# Write-behind queue of (conversation_id, role, content, sources) and its flusher.
+_pending: list[tuple[int, str, str, list[dict] | None]] = []
+# Messages per conversation that are queued or being written, not yet committed.
+_unflushed: Counter[int] = Counter()
+_pending_lock = threading.Lock()
+_flush_wakeup = threading.Event()
+_flusher_stop = threading.Event()
+_flusher: threading.Thread | None = None
+
+
+def _ensure_column(conn: sqlite3.Connection, table: str, column: str, decl: str) -> bool:
+    """Add a column to an existing table created by an older schema.
+
+    Returns True if the column was added and may need backfilling.
+    """
+    columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column in columns:
+        return False
+    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+    return True
+
+
+def _connect() -> sqlite3.Connection:
+    """Open a connection with the shared pragmas."""
+    conn = sqlite3.connect(
+        str(DB_PATH),
+        check_same_thread=False,
+        isolation_level=None,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    # WAL keeps readers off the writer's lock; NORMAL only fsyncs at checkpoints,
+    # which is durable against application crashes in WAL mode.
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+def _migrate_conversation_counters(conn: sqlite3.Connection) -> None:
+    """Add and backfill the denormalized per-conversation counters.
+
+    ``updated_seq`` orders conversations by last activity: ``updated_at`` only has
+    second resolution, so ties would make recency ordering and cursors ambiguous.
+    """
+    if _ensure_column(conn, "conversations", "message_count", "INTEGER NOT NULL DEFAULT 0"):
+        conn.execute(
+            "UPDATE conversations SET message_count = "
+            "(SELECT COUNT(*) FROM messages WHERE conversation_id = conversations.id)"
+        )
+    if _ensure_column(conn, "conversations", "last_message_at", "TEXT"):
+        conn.execute(
+            "UPDATE conversations SET last_message_at = "
+            "(SELECT MAX(created_at) FROM messages WHERE conversation_id = conversations.id)"
+        )
+    if _ensure_column(conn, "conversations", "updated_seq", "INTEGER NOT NULL DEFAULT 0"):
+        conn.execute(
+            "UPDATE conversations SET updated_seq = ranked.seq FROM "
+            "(SELECT id, ROW_NUMBER() OVER (ORDER BY updated_at, id) AS seq "
+            "FROM conversations) AS ranked WHERE conversations.id = ranked.id"
+        )
+
+
+def _create_search_index(conn: sqlite3.Connection) -> None:
+    """Create the FTS5 index over message content and the triggers that maintain it.
+
+    The index is external-content: it stores only the tokens and reads text for
+    snippets from ``messages``. Existing databases are indexed once on creation.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+    ).fetchone()
+    if exists:
+        return
+    conn.execute(
+        "CREATE VIRTUAL TABLE messages_fts USING fts5("
+        "content, content='messages', content_rowid='id', tokenize='porter unicode61')"
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, content)
+            VALUES ('delete', old.id, old.content);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, content)
+            VALUES ('delete', old.id, old.content);
+            INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+        END
+        """
+    )
+    conn.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
 
 
 def _get_conn() -> sqlite3.Connection:
-    """Get or create the SQLite connection (singleton)."""
+    """Get or create the writer connection, creating the schema on first use."""
     global _conn
-    if _conn is None:
-        DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-        _conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
-        _conn.row_factory = sqlite3.Row
-        _conn.execute("PRAGMA journal_mode=WAL")
-        _conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS conversations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                created_at TEXT NOT NULL DEFAULT (datetime('now')),
-                updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+    if _conn is not None:
+        return _conn
+    with _write_lock:
+        if _conn is None:
+            DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+            conn = _connect()
+            # Only takes effect on a new database; older ones are converted by
+            # enable_incremental_vacuum().
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT NOT NULL,
+                    created_at TEXT NOT NULL DEFAULT (datetime('now')),
+                    updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+                )
+                """
             )
-            """
-        )
-        _conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                conversation_id INTEGER NOT NULL,
-                role TEXT NOT NULL CHECK(role IN ('user', 'assistant')),
-                content TEXT NOT NULL,
-                sources TEXT,
-                created_at TEXT NOT NULL DEFAULT (datetime('now')),
-                FOREIGN KEY (conversation_id) REFERENCES conversations(id)
-                    ON DELETE CASCADE
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    conversation_id INTEGER NOT NULL,
+                    role TEXT NOT NULL CHECK(role IN ('user', 'assistant')),
+                    content TEXT NOT NULL,
+                    sources TEXT,
+                    created_at TEXT NOT NULL DEFAULT (datetime('now')),
+                    FOREIGN KEY (conversation_id) REFERENCES conversations(id)
+                        ON DELETE CASCADE
+                )
+                """
             )
-            """
-        )
-        _conn.execute(
-            """
-            CREATE INDEX IF NOT EXISTS idx_messages_conversation
-            ON messages(conversation_id)
-            """
-        )
-        _conn.commit()
-        logger.info("Conversation database initialized at %s", DB_PATH)
+            conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_messages_conversation
+                ON messages(conversation_id)
+                """
+            )
+            # Content-addressed source previews shared by every message that cites them.
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS source_previews (
+                    hash TEXT PRIMARY KEY,
+                    content NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+            _ensure_column(conn, "conversations", "summary", "TEXT")
+            _ensure_column(conn, "conversations", "summary_through", "INTEGER NOT NULL DEFAULT 0")
+            _migrate_conversation_counters(conn)
+            conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_conversations_recent
+                ON conversations(updated_seq)
+                """
+            )
+            _create_search_index(conn)
+            conn.execute("COMMIT")
+            _conn = conn
+            logger.info("Conversation database initialized at %s", DB_PATH)
     return _conn
 
 
+def _get_read_conn() -> sqlite3.Connection:
+    """Get this thread's read connection."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.generation == _generation:
+        return conn
+    _get_conn()
+    with _write_lock:
+        conn = _connect()
+        conn.execute("PRAGMA query_only=ON")
+        _readers.append(conn)
+        _local.conn = conn
+        _local.generation = _generation
+    return conn
+
+
+def _is_busy(error: sqlite3.OperationalError) -> bool:
+    """Whether an error means another connection holds the database lock."""
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+def _write(func: Callable[[sqlite3.Connection], T]) -> T:
+    """Run func(conn) in one serialized write transaction.
+
+    The transaction is rolled back on error and retried with backoff while the
+    database is locked by another process.
+    """
+    global _commit_count
+    for attempt in range(WRITE_RETRIES):
+        with _write_lock:
+            conn = _get_conn()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                result = func(conn)
+                conn.execute("COMMIT")
+                _commit_count += 1
+                return result
+            except sqlite3.OperationalError as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                if not _is_busy(e) or attempt == WRITE_RETRIES - 1:
+                    raise
+                logger.warning("Conversation database busy, retrying write (%d)", attempt + 1)
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+        time.sleep(WRITE_RETRY_BACKOFF * 2**attempt)
+    raise AssertionError("unreachable")
+
+
+def _compress(text: str) -> str | bytes:
+    """Compress text worth compressing; short text is stored as is."""
+    data = text.encode()
+    return zlib.compress(data) if len(data) >= COMPRESS_MIN_BYTES else text
+
+
+def _decompress(value: str | bytes) -> str:
+    """Inverse of _compress."""
+    return zlib.decompress(value).decode() if isinstance(value, bytes) else value
+
+
+def _store_sources(conn: sqlite3.Connection, sources: list[dict]) -> str | bytes:
+    """Store each source's preview once by content hash; return the encoded references."""
+    refs = []
+    previews = {}
+    for source in sources:
+        ref = dict(source)
+        content = ref.pop("content", None)
+        if content is not None:
+            digest = hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+            previews[digest] = _compress(content)
+            ref["chunk"] = digest
+        refs.append(ref)
+    conn.executemany(
+        "INSERT OR IGNORE INTO source_previews (hash, content) VALUES (?, ?)", previews.items()
+    )
+    return _compress(json.dumps(refs))
+
+
+def _rows_to_messages(
+    conn: sqlite3.Connection, rows: list[sqlite3.Row], with_ids: bool = False
+) -> list[dict]:
+    """Convert message rows to dicts, hydrating source previews in one query."""
+    decoded = [json.loads(_decompress(row["sources"])) if row["sources"] else None for row in rows]
+    hashes = {ref["chunk"] for refs in decoded if refs for ref in refs if "chunk" in ref}
+    previews = {}
+    if hashes:
+        placeholders = ", ".join("?" * len(hashes))
+        previews = {
+            row["hash"]: _decompress(row["content"])
+            for row in conn.execute(
+                f"SELECT hash, content FROM source_previews WHERE hash IN ({placeholders})",
+                tuple(hashes),
+            )
+        }
+
+    messages = []
+    for row, refs in zip(rows, decoded, strict=True):
+        msg = {"id": row["id"]} if with_ids else {}
+        msg.update(role=row["role"], content=row["content"], created_at=row["created_at"])
+        if refs:
+            msg["sources"] = [
+                {"content": previews.get(ref.pop("chunk"), ""), **ref} if "chunk" in ref else ref
+                for ref in refs
+            ]
+        messages.append(msg)
+    return messages
+
+
+@SQLITE_SECONDS.timed(operation="create_conversation")
 def create_conversation(title: str = "New Chat") -> int:
     """Create a new conversation and return its ID."""
-    conn = _get_conn()
-    cursor = conn.execute("INSERT INTO conversations (title) VALUES (?)", (title,))
-    conn.commit()
-    assert cursor.lastrowid is not None
-    return cursor.lastrowid
 
+    def insert(conn: sqlite3.Connection) -> int:
+        cursor = conn.execute(
+            f"INSERT INTO conversations (title, updated_seq) VALUES (?, {_NEXT_SEQ})", (title,)
+        )
+        assert cursor.lastrowid is not None
+        return cursor.lastrowid
 
-def add_message(
+    return _write(insert)
+
+
+@SQLITE_SECONDS.timed(operation="conversation_exists")
+def conversation_exists(conversation_id: int) -> bool:
+    """Whether a conversation with this ID exists."""
+    row = (
+        _get_read_conn()
+        .execute("SELECT 1 FROM conversations WHERE id = ?", (conversation_id,))
+        .fetchone()
+    )
+    return row is not None
+
+
+def _insert_message(
+    conn: sqlite3.Connection,
     conversation_id: int,
     role: str,
     content: str,
-    sources: list[dict] | None = None,
+    sources: list[dict] | None,
 ) -> int:
-    """Add a message to a conversation. Returns the message ID."""
-    conn = _get_conn()
-    sources_json = json.dumps(sources) if sources else None
+    """Insert a message and update its conversation's counters."""
     cursor = conn.execute(
         "INSERT INTO messages (conversation_id, role, content, sources) VALUES (?, ?, ?, ?)",
-        (conversation_id, role, content, sources_json),
+        (conversation_id, role, content, _store_sources(conn, sources) if sources else None),
     )
     conn.execute(
-        "UPDATE conversations SET updated_at = datetime('now') WHERE id = ?",
+        "UPDATE conversations SET updated_at = datetime('now'), "
+        f"updated_seq = {_NEXT_SEQ}, message_count = message_count + 1, "
+        "last_message_at = datetime('now') WHERE id = ?",
         (conversation_id,),
     )
-    conn.commit()
     assert cursor.lastrowid is not None
     return cursor.lastrowid
 
 
+@SQLITE_SECONDS.timed(operation="add_message")
+def add_message(
+    conversation_id: int,
+    role: str,
+    content: str,
+    sources: list[dict] | None = None,
+) -> int | None:
+    """Add a message to a conversation. Returns the message ID.
+
+    In write-behind mode the message is queued instead and None is returned.
+    """
+    if not WRITE_BEHIND:
+        return _write(lambda conn: _insert_message(conn, conversation_id, role, content, sources))
+
+    if role not in ROLES:
+        raise ValueError(f"Invalid message role: {role!r}")
+    _start_flusher()
+    with _pending_lock:
+        _pending.append((conversation_id, role, content, sources))
+        _unflushed[conversation_id] += 1
+        full = len(_pending) >= WRITE_BEHIND_MAX_BATCH
+    if full:
+        _flush_wakeup.set()
+    return None
+
+
+def _take_pending(conversation_ids: list[int] | None = None) -> list:
+    """Remove and return the queued messages of these conversations, or all of them."""
+    global _pending
+    with _pending_lock:
+        if conversation_ids is None:
+            batch, _pending = _pending, []
+        else:
+            wanted = set(conversation_ids)
+            batch = [m for m in _pending if m[0] in wanted]
+            _pending = [m for m in _pending if m[0] not in wanted]
+    return batch
+
+
+def _settled(batch: list) -> None:
+    """Mark messages as no longer unflushed, once committed or dropped."""
+    with _pending_lock:
+        _unflushed.subtract(message[0] for message in batch)
+        for conversation_id in {message[0] for message in batch}:
+            if _unflushed[conversation_id] <= 0:
+                del _unflushed[conversation_id]
+
+
+def _flush_conversation(conversation_id: int) -> None:
+    """Write a conversation's queued messages, waiting for any already being written."""
+    if _unflushed.get(conversation_id):
+        flush([conversation_id])
+
+
+@SQLITE_SECONDS.timed(operation="flush")
+def flush(conversation_ids: list[int] | None = None) -> int:
+    """Write queued messages in one transaction. Returns how many were written.
+
+    Only the messages of `conversation_ids` are written if given, otherwise all.
+    """
+    with _write_lock:
+        batch = _take_pending(conversation_ids)
+        if not batch:
+            return 0
+        try:
+            _write(lambda conn: [_insert_message(conn, *message) for message in batch])
+        except sqlite3.IntegrityError:
+            # One bad message (e.g. for a deleted conversation) must not block the rest.
+            written = 0
+            for message in batch:
+                try:
+                    _write(lambda conn, message=message: _insert_message(conn, *message))
+                    written += 1
+                except sqlite3.IntegrityError as e:
+                    logger.warning("Dropped queued message for conversation %d: %s", message[0], e)
+            _settled(batch)
+            return written
+        except BaseException:
+            with _pending_lock:
+                _pending[:0] = batch
+            raise
+        _settled(batch)
+    return len(batch)
+
+
+def _flush_loop() -> None:
+    """Flush queued messages every interval, or sooner once a batch fills up."""
+    while not _flusher_stop.is_set():
+        _flush_wakeup.wait(WRITE_BEHIND_INTERVAL_MS / 1000)
+        _flush_wakeup.clear()
+        try:
+            flush()
+        except Exception:
+            logger.exception("Failed to flush queued conversation messages")
+
+
+def _start_flusher() -> None:
+    """Start the write-behind flusher thread if it is not running."""
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _pending_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher_stop.clear()
+            _flusher = threading.Thread(
+                target=_flush_loop, name="conversation-write-behind", daemon=True
+            )
+            _flusher.start()
+
+
+def _stop_flusher() -> None:
+    """Stop the write-behind flusher thread, if running."""
+    global _flusher
+    if _flusher is not None:
+        _flusher_stop.set()
+        _flush_wakeup.set()
+        _flusher.join()
+        _flusher = None
+
+
+@SQLITE_SECONDS.timed(operation="get_messages")
 def get_messages(conversation_id: int) -> list[dict]:
     """Get all messages for a conversation."""
-    conn = _get_conn()
+    _flush_conversation(conversation_id)
+    conn = _get_read_conn()
     rows = conn.execute(
-        "SELECT role, content, sources, created_at FROM messages "
+        "SELECT id, role, content, sources, created_at FROM messages "
         "WHERE conversation_id = ? ORDER BY id",
         (conversation_id,),
     ).fetchall()
-    messages = []
-    for row in rows:
-        msg = {
-            "role": row["role"],
-            "content": row["content"],
-            "created_at": row["created_at"],
-        }
-        if row["sources"]:
-            msg["sources"] = json.loads(row["sources"])
-        messages.append(msg)
-    return messages
+    return _rows_to_messages(conn, rows)
+
+
+def _message_columns(include_sources: bool) -> str:
+    """Columns for a message query, skipping the sources payload unless requested."""
+    sources = "sources" if include_sources else "NULL AS sources"
+    return f"id, role, content, {sources}, created_at"
+
+
+@SQLITE_SECONDS.timed(operation="get_recent_messages")
+def get_recent_messages(
+    conversation_id: int, limit: int, include_sources: bool = True
+) -> list[dict]:
+    """Get the last `limit` messages of a conversation in chronological order.
+
+    Reads only those rows via the (conversation_id, id) index, so the cost does
+    not depend on the length of the conversation.
+    """
+    _flush_conversation(conversation_id)
+    conn = _get_read_conn()
+    rows = conn.execute(
+        f"SELECT {_message_columns(include_sources)} FROM messages "
+        "WHERE conversation_id = ? ORDER BY id DESC LIMIT ?",
+        (conversation_id, limit),
+    ).fetchall()
+    return _rows_to_messages(conn, rows[::-1])
+
+
+@SQLITE_SECONDS.timed(operation="list_messages")
+def list_messages(
+    conversation_id: int,
+    after_id: int | None = None,
+    limit: int = 100,
+    include_sources: bool = True,
+) -> list[dict]:
+    """Get one page of a conversation's messages in chronological order.
+
+    Keyset pagination: pass the ``id`` of the last message of the previous page as
+    ``after_id`` to get the next one.
+    """
+    _flush_conversation(conversation_id)
+    conn = _get_read_conn()
+    rows = conn.execute(
+        f"SELECT {_message_columns(include_sources)} FROM messages "
+        "WHERE conversation_id = ? AND id > ? ORDER BY id LIMIT ?",
+        (conversation_id, after_id or 0, limit),
+    ).fetchall()
+    return _rows_to_messages(conn, rows, with_ids=True)
 
 
-def list_conversations() -> list[dict]:
-    """List all conversations ordered by most recent."""
-    conn = _get_conn()
+@SQLITE_SECONDS.timed(operation="get_summary")
+def get_summary(conversation_id: int) -> str | None:
+    """Get the rolling summary of a conversation, if one has been written."""
+    conn = _get_read_conn()
+    row = conn.execute(
+        "SELECT summary FROM conversations WHERE id = ?", (conversation_id,)
+    ).fetchone()
+    return row["summary"] if row else None
+
+
+@SQLITE_SECONDS.timed(operation="get_unsummarized_messages")
+def get_unsummarized_messages(conversation_id: int) -> list[dict]:
+    """Get messages newer than the last one folded into the summary, with their IDs.
+
+    The conversation's queued messages are flushed first, so the latest turn is
+    the one at the end of the result.
+    """
+    _flush_conversation(conversation_id)
+    conn = _get_read_conn()
+    rows = conn.execute(
+        "SELECT m.id, m.role, m.content, m.sources, m.created_at FROM messages m "
+        "JOIN conversations c ON c.id = m.conversation_id "
+        "WHERE m.conversation_id = ? AND m.id > c.summary_through ORDER BY m.id",
+        (conversation_id,),
+    ).fetchall()
+    return _rows_to_messages(conn, rows, with_ids=True)
+
+
+@SQLITE_SECONDS.timed(operation="update_summary")
+def update_summary(conversation_id: int, summary: str, through_message_id: int) -> None:
+    """Store a new rolling summary covering messages up to `through_message_id`."""
+    _write(
+        lambda conn: conn.execute(
+            "UPDATE conversations SET summary = ?, summary_through = ? "
+            "WHERE id = ? AND summary_through < ?",
+            (summary, through_message_id, conversation_id, through_message_id),
+        )
+    )
+
+
+@SQLITE_SECONDS.timed(operation="list_conversations")
+def list_conversations(limit: int | None = None, before: int | None = None) -> list[dict]:
+    """List conversations ordered by most recent activity.
+
+    Keyset pagination: pass the ``updated_seq`` of the last conversation of the
+    previous page as ``before`` to get the next one.
+    """
+    conn = _get_read_conn()
     rows = conn.execute(
-        "SELECT c.id, c.title, c.created_at, c.updated_at, "
-        "COUNT(m.id) as message_count "
-        "FROM conversations c LEFT JOIN messages m ON c.id = m.conversation_id "
-        "GROUP BY c.id ORDER BY c.updated_at DESC",
+        "SELECT id, title, created_at, updated_at, message_count, last_message_at, "
+        "updated_seq FROM conversations WHERE updated_seq < ? "
+        "ORDER BY updated_seq DESC LIMIT ?",
+        (before if before is not None else 2**63 - 1, limit if limit is not None else -1),
     ).fetchall()
     return [dict(row) for row in rows]
 
 
+def _match_expression(query: str) -> str:
+    """Turn free text into an FTS5 query matching every word, ignoring FTS syntax."""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+@SQLITE_SECONDS.timed(operation="search_messages")
+def search_messages(query: str, limit: int = 20, offset: int = 0) -> list[dict]:
+    """Full-text search over all messages, best matches first.
+
+    Each result has the message and its conversation plus a ``snippet`` with the
+    matched terms wrapped in ``[`` and ``]``. Only the newest SEARCH_CANDIDATES
+    matches are ranked, read from the FTS5 index in rowid order, so a term found
+    in most messages costs no more than a rare one; search_truncated() tells
+    whether older matches were left out.
+    """
+    expression = _match_expression(query)
+    if not expression:
+        return []
+    conn = _get_read_conn()
+    rows = conn.execute(
+        "SELECT m.id, m.conversation_id, c.title, m.role, m.created_at, hits.score "
+        "FROM (SELECT rowid AS id, -bm25(messages_fts) AS score FROM messages_fts "
+        "WHERE messages_fts MATCH ? ORDER BY rowid DESC LIMIT ?) AS hits "
+        "JOIN messages m ON m.id = hits.id JOIN conversations c ON c.id = m.conversation_id "
+        "ORDER BY hits.score DESC, m.id DESC LIMIT ? OFFSET ?",
+        (expression, SEARCH_CANDIDATES, limit, offset),
+    ).fetchall()
+    if not rows:
+        return []
+    ids = [row["id"] for row in rows]
+    snippets = dict(
+        conn.execute(
+            "SELECT rowid, snippet(messages_fts, 0, '[', ']', '…', 16) FROM messages_fts "
+            f"WHERE messages_fts MATCH ? AND rowid IN ({', '.join('?' * len(ids))})",
+            (expression, *ids),
+        ).fetchall()
+    )
+    return [
+        {**dict(row), "score": round(row["score"], 4), "snippet": snippets.get(row["id"], "")}
+        for row in rows
+    ]
+
+
+def search_truncated(query: str) -> bool:
+    """Whether `query` matches more messages than search_messages ranks."""
+    expression = _match_expression(query)
+    if not expression:
+        return False
+    (matches,) = (
+        _get_read_conn()
+        .execute(
+            "SELECT count(*) FROM (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ? LIMIT ?)",
+            (expression, SEARCH_CANDIDATES + 1),
+        )
+        .fetchone()
+    )
+    return matches > SEARCH_CANDIDATES
+
+
 def delete_conversation(conversation_id: int) -> None:
     """Delete a conversation and its messages."""
-    conn = _get_conn()
-    conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
-    conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
-    conn.commit()
+    delete_conversations([conversation_id])
+
+
+@SQLITE_SECONDS.timed(operation="delete_conversations")
+def delete_conversations(conversation_ids: list[int]) -> int:
+    """Delete conversations and, by cascade, their messages in one transaction.
+
+    Returns the number of conversations deleted. Callers bound the transaction
+    by passing a bounded number of IDs. Their queued messages are dropped.
+    """
+    if not conversation_ids:
+        return 0
+    placeholders = ", ".join("?" * len(conversation_ids))
+
+    def delete(conn: sqlite3.Connection) -> int:
+        _settled(_take_pending(conversation_ids))
+        return conn.execute(
+            f"DELETE FROM conversations WHERE id IN ({placeholders})", tuple(conversation_ids)
+        ).rowcount
+
+    return _write(delete)
+
+
+def delete_unchanged_conversations(conversations: list[dict]) -> int:
+    """Delete exported conversations that have not changed since their export.
+
+    Each dict needs the ``id`` and ``updated_seq`` it was exported with.
+    Conversations written to since, including ones with queued messages, are
+    kept for a later pass. Returns the number deleted.
+    """
+
+    def delete(conn: sqlite3.Connection) -> int:
+        unchanged = [
+            (c["id"], c["updated_seq"]) for c in conversations if not _unflushed.get(c["id"])
+        ]
+        return conn.executemany(
+            "DELETE FROM conversations WHERE id = ? AND updated_seq = ?", unchanged
+        ).rowcount
+
+    return _write(delete)
+
+
+def oldest_conversations(limit: int, active_before: str | None = None) -> list[int]:
+    """IDs of the least recently active conversations, oldest first.
+
+    With active_before (an SQLite ``datetime`` string), only conversations whose
+    last activity is earlier than it.
+    """
+    conn = _get_read_conn()
+    rows = conn.execute(
+        "SELECT id FROM conversations WHERE updated_at < ? ORDER BY updated_seq LIMIT ?",
+        (active_before or "9999-12-31", limit),
+    ).fetchall()
+    return [row["id"] for row in rows]
+
+
+def export_conversations(conversation_ids: list[int]) -> list[dict]:
+    """Conversations with all their messages and hydrated sources, for archival.
+
+    Each carries the ``updated_seq`` it was read at, for delete_unchanged_conversations.
+    """
+    if not conversation_ids:
+        return []
+    flush(conversation_ids)
+    conn = _get_read_conn()
+    placeholders = ", ".join("?" * len(conversation_ids))
+    # One snapshot, so each updated_seq matches the messages exported with it.
+    conn.execute("BEGIN")
+    try:
+        conversations = [
+            dict(row)
+            for row in conn.execute(
+                "SELECT id, title, created_at, updated_at, updated_seq, summary "
+                f"FROM conversations WHERE id IN ({placeholders}) ORDER BY updated_seq",
+                tuple(conversation_ids),
+            )
+        ]
+        for conversation in conversations:
+            rows = conn.execute(
+                "SELECT id, role, content, sources, created_at FROM messages "
+                "WHERE conversation_id = ? ORDER BY id",
+                (conversation["id"],),
+            ).fetchall()
+            conversation["messages"] = _rows_to_messages(conn, rows)
+    finally:
+        conn.execute("COMMIT")
+    return conversations
 
 
+def sweep_source_previews() -> int:
+    """Delete source previews no message refers to any more. Returns how many.
+
+    References are collected from a read snapshot; previews cited by messages
+    written after it are re-checked inside the deleting transaction.
+    """
+    conn = _get_read_conn()
+    conn.execute("BEGIN")
+    try:
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+        referenced = _referenced_previews(conn, "WHERE sources IS NOT NULL AND id <= ?", max_id)
+        orphans = [
+            row["hash"]
+            for row in conn.execute("SELECT hash FROM source_previews")
+            if row["hash"] not in referenced
+        ]
+    finally:
+        conn.execute("COMMIT")
+    if not orphans:
+        return 0
+
+    def delete(conn: sqlite3.Connection) -> int:
+        newer = _referenced_previews(conn, "WHERE sources IS NOT NULL AND id > ?", max_id)
+        doomed = [(h,) for h in orphans if h not in newer]
+        conn.executemany("DELETE FROM source_previews WHERE hash = ?", doomed)
+        return len(doomed)
+
+    return _write(delete)
+
+
+def _referenced_previews(conn: sqlite3.Connection, where: str, *params) -> set[str]:
+    """Preview hashes referenced by the messages matching a WHERE clause."""
+    referenced = set()
+    for row in conn.execute(f"SELECT sources FROM messages {where}", params):
+        for ref in json.loads(_decompress(row["sources"])):
+            if "chunk" in ref:
+                referenced.add(ref["chunk"])
+    return referenced
+
+
+def database_size() -> int:
+    """Bytes of the database file in use, excluding free pages awaiting vacuum."""
+    conn = _get_read_conn()
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return (page_count - free) * page_size
+
+
+def incremental_vacuum_enabled() -> bool:
+    """Whether the database can return free pages with incremental_vacuum."""
+    return _get_read_conn().execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+def enable_incremental_vacuum() -> bool:
+    """Switch a database created without auto_vacuum to incremental mode.
+
+    Offline maintenance: this needs one full VACUUM, which rewrites the whole
+    file and blocks every write until it finishes, so run it while the API is
+    stopped. Returns True if the database was converted.
+    """
+    flush()
+    with _write_lock:
+        conn = _get_conn()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    logger.info("Converted %s to incremental auto_vacuum", DB_PATH)
+    return True
+
+
+def incremental_vacuum(max_pages: int) -> int:
+    """Return up to max_pages free pages to the filesystem. Returns how many."""
+
+    def vacuum(conn: sqlite3.Connection) -> int:
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.execute(f"PRAGMA incremental_vacuum({int(max_pages)})").fetchall()
+        return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    return _write(vacuum)
+
+
+@SQLITE_SECONDS.timed(operation="rename_conversation")
 def rename_conversation(conversation_id: int, title: str) -> None:
     """Rename a conversation."""
-    conn = _get_conn()
-    conn.execute(
-        "UPDATE conversations SET title = ? WHERE id = ?",
-        (title, conversation_id),
+    _write(
+        lambda conn: conn.execute(
+            "UPDATE conversations SET title = ? WHERE id = ?",
+            (title, conversation_id),
+        )
     )
-    conn.commit()
 
 
 def close() -> None:
-    """Close the database connection."""
-    global _conn
-    if _conn is not None:
-        _conn.close()
-        _conn = None
+    """Flush queued messages, then close the writer and every thread's read connection."""
+    global _conn, _generation
+    _stop_flusher()
+    if _pending:
+        flush()
+    with _write_lock:
+        for reader in _readers:
+            reader.close()
+        _readers.clear()
+        _generation += 1
+        if _conn is not None:
+            _conn.close()
+            _conn = None
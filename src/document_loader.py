@@ -3,12 +3,6 @@ import io
 import logging
 import os
 
-from langchain_community.document_loaders import (
-    Docx2txtLoader,
-    PyPDFLoader,
-    TextLoader,
-    WebBaseLoader,
-)
 from langchain_core.documents import Document
 
 from src.config import DATA_DIR
@@ -28,6 +22,8 @@ def _save_uploaded_file(uploaded_file):
 def load_pdf(uploaded_file):
     """Load a PDF file and return documents with metadata."""
     try:
+        from langchain_community.document_loaders import PyPDFLoader
+
         file_path = _save_uploaded_file(uploaded_file)
         loader = PyPDFLoader(file_path)
         documents = loader.load()
@@ -49,6 +45,8 @@ def load_pdf(uploaded_file):
 def load_txt(uploaded_file):
     """Load a TXT file and return documents with metadata."""
     try:
+        from langchain_community.document_loaders import TextLoader
+
         file_path = _save_uploaded_file(uploaded_file)
         loader = TextLoader(file_path, encoding="utf-8")
         documents = loader.load()
@@ -67,6 +65,8 @@ def load_txt(uploaded_file):
 def load_docx(uploaded_file):
     """Load a DOCX file and return documents with metadata."""
     try:
+        from langchain_community.document_loaders import Docx2txtLoader
+
         file_path = _save_uploaded_file(uploaded_file)
         loader = Docx2txtLoader(file_path)
         documents = loader.load()
@@ -131,6 +131,8 @@ def load_web(url):
         if not url.startswith(("http://", "https://")):
             raise ValueError(f"Invalid URL: '{url}'. Must start with http:// or https://")
 
+        from langchain_community.document_loaders import WebBaseLoader
+
         loader = WebBaseLoader(url)
         documents = loader.load()
 
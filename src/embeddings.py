@@ -1,17 +1,37 @@
-from langchain_huggingface import HuggingFaceEmbeddings
+import threading
 
 from src.config import EMBEDDING_MODEL
+from src.metrics import EMBEDDING_SECONDS
 
 _embeddings = None
+# Held while the model loads, so concurrent first callers share one instance.
+_lock = threading.Lock()
 
 
 def get_embeddings():
     """Get or create the embedding model (singleton)."""
     global _embeddings
     if _embeddings is None:
-        _embeddings = HuggingFaceEmbeddings(
-            model_name=EMBEDDING_MODEL,
-            model_kwargs={"device": "cpu"},
-            encode_kwargs={"normalize_embeddings": True},
-        )
+        with _lock:
+            if _embeddings is None:
+                # Deferred: langchain_huggingface imports torch and sentence-transformers.
+                from langchain_huggingface import HuggingFaceEmbeddings
+
+                _embeddings = HuggingFaceEmbeddings(
+                    model_name=EMBEDDING_MODEL,
+                    model_kwargs={"device": "cpu"},
+                    encode_kwargs={"normalize_embeddings": True},
+                )
     return _embeddings
+
+
+def embed_query(text, embeddings=None):
+    """Embed a search query, recording the latency."""
+    with EMBEDDING_SECONDS.time(kind="query"):
+        return (embeddings or get_embeddings()).embed_query(text)
+
+
+def embed_documents(texts, embeddings=None):
+    """Embed several texts in one call, recording the latency."""
+    with EMBEDDING_SECONDS.time(kind="documents"):
+        return (embeddings or get_embeddings()).embed_documents(texts)
@@ -4,10 +4,21 @@ from src.embeddings import get_embeddings
 
 
 def calculate_retrieval_relevance(query, documents):
-    """Calculate cosine similarity between query and each retrieved document."""
+    """Calculate the relevance of each retrieved document to the query.
+
+    Uses the relevance scores the retriever attached to the documents. Documents
+    without one are re-embedded and compared by cosine similarity.
+    """
     if not documents:
         return {"scores": [], "avg_score": 0.0}
 
+    if all("score" in doc.metadata for doc in documents):
+        scores = [round(float(doc.metadata["score"]), 4) for doc in documents]
+        return {
+            "scores": scores,
+            "avg_score": round(sum(scores) / len(scores), 4),
+        }
+
     embeddings = get_embeddings()
     query_embedding = embeddings.embed_query(query)
 
@@ -35,15 +46,28 @@ def calculate_response_metrics(response_time, sources, answer):
     }
 
 
-def evaluate_response(query, answer, context_docs, sources, response_time):
-    """Run full evaluation on a RAG response."""
+def evaluate_response(
+    query, answer, context_docs, sources, response_time, prompt_tokens=None, k=None
+):
+    """Run full evaluation on a RAG response.
+
+    k is the number of chunks the adaptive retriever chose; it is read from the
+    context documents' metadata when not given.
+    """
     relevance = calculate_retrieval_relevance(query, context_docs)
     response_metrics = calculate_response_metrics(response_time, sources, answer)
 
-    return {
+    evaluation = {
         "relevance": relevance,
         "response_time": response_metrics["response_time"],
         "chunks_used": response_metrics["chunks_used"],
         "answer_length": response_metrics["answer_length"],
         "answer_words": response_metrics["answer_words"],
     }
+    if prompt_tokens is not None:
+        evaluation["prompt_tokens"] = prompt_tokens
+    if k is None and context_docs:
+        k = context_docs[0].metadata.get("retrieved_k")
+    if k is not None:
+        evaluation["k"] = k
+    return evaluation
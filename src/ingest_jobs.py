@@ -0,0 +1,146 @@
+"""Document ingestion as background jobs on a bounded worker pool.
+
+Loading, splitting and embedding run off the event loop on at most
+INGEST_MAX_CONCURRENCY worker threads, so a large upload never delays queries.
+Each job reports its stage and progress until it is done or has failed.
+"""
+
+import io
+import logging
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+
+from src.config import INGEST_BATCH_SIZE, INGEST_MAX_CONCURRENCY
+from src.metrics import INGEST_STAGE_SECONDS
+from src.profiling import profile_thread
+from src.text_splitter import split_documents
+from src.vector_store import add_documents
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs kept for status queries; the oldest are forgotten first.
+MAX_FINISHED_JOBS = 1000
+
+
+@dataclass
+class IngestJob:
+    """Status of one ingestion job."""
+
+    id: str
+    source: str
+    status: str = "queued"  # queued, running, done or failed
+    stage: str = "queued"  # queued, loading, splitting, embedding or done
+    progress: float = 0.0
+    documents: int = 0
+    chunks_total: int = 0
+    chunks_done: int = 0
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class UploadedFile(io.BytesIO):
+    """In-memory upload with the ``name``/``getbuffer()`` interface the loaders expect."""
+
+    def __init__(self, name: str, data: bytes):
+        super().__init__(data)
+        self.name = name
+
+
+_jobs: dict[str, IngestJob] = {}
+_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=INGEST_MAX_CONCURRENCY, thread_name_prefix="ingest"
+            )
+        return _executor
+
+
+def _update(job: IngestJob, **changes) -> None:
+    with _lock:
+        for name, value in changes.items():
+            setattr(job, name, value)
+
+
+def _forget_old_jobs() -> None:
+    finished = [job for job in _jobs.values() if job.finished_at is not None]
+    excess = len(finished) - MAX_FINISHED_JOBS
+    if excess > 0:
+        for job in sorted(finished, key=lambda j: j.finished_at)[:excess]:
+            del _jobs[job.id]
+
+
+def _run(job: IngestJob, load: Callable[[], list], profile: bool = False) -> None:
+    """Load, split and embed in batches, recording progress on the job."""
+    with profile_thread("ingest", profile):
+        _ingest(job, load)
+
+
+def _ingest(job: IngestJob, load: Callable[[], list]) -> None:
+    try:
+        _update(job, status="running", stage="loading")
+        with INGEST_STAGE_SECONDS.time(stage="loading"):
+            documents = load()
+        _update(job, stage="splitting", documents=len(documents), progress=0.1)
+        with INGEST_STAGE_SECONDS.time(stage="splitting"):
+            chunks = split_documents(documents)
+        _update(job, stage="embedding", chunks_total=len(chunks), progress=0.2)
+        with INGEST_STAGE_SECONDS.time(stage="embedding"):
+            for start in range(0, len(chunks), INGEST_BATCH_SIZE):
+                done = start + add_documents(chunks[start : start + INGEST_BATCH_SIZE])
+                _update(job, chunks_done=done, progress=0.2 + 0.8 * done / len(chunks))
+        _update(job, status="done", stage="done", progress=1.0)
+        logger.info("Ingest job %s added %d chunks from %s", job.id, len(chunks), job.source)
+    except Exception as e:
+        logger.error("Ingest job %s failed for %s: %s", job.id, job.source, e)
+        _update(job, status="failed", error=str(e))
+    finally:
+        with _lock:
+            job.finished_at = time.time()
+            _forget_old_jobs()
+
+
+def submit(source: str, load: Callable[[], list], profile: bool = False) -> IngestJob:
+    """Queue an ingestion job; load() returns the documents to split and embed.
+
+    With profile, the job is run under cProfile (see src.profiling).
+    """
+    job = IngestJob(id=uuid.uuid4().hex, source=source)
+    with _lock:
+        _jobs[job.id] = job
+    _get_executor().submit(_run, job, load, profile)
+    return job
+
+
+def get_job(job_id: str) -> IngestJob | None:
+    """Get a job by ID, or None if it is unknown or has been forgotten."""
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def active_jobs() -> int:
+    """Number of jobs queued or running."""
+    with _lock:
+        return sum(job.finished_at is None for job in _jobs.values())
+
+
+def shutdown(wait: bool = True) -> None:
+    """Stop the worker pool, dropping queued jobs and finishing running ones."""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait, cancel_futures=True)
@@ -1,4 +1,5 @@
 import logging
+import threading
 
 from src.config import HF_API_TOKEN, HF_MODEL, OLLAMA_BASE_URL, OLLAMA_MODEL
 
@@ -6,6 +7,8 @@ logger = logging.getLogger(__name__)
 
 _llm = None
 _llm_provider = None
+# Held while connecting, so concurrent first callers share one connection attempt.
+_lock = threading.Lock()
 
 
 def _try_ollama():
@@ -51,6 +54,14 @@ def get_llm():
 
     if _llm is not None:
         return _llm, _llm_provider
+    with _lock:
+        if _llm is not None:
+            return _llm, _llm_provider
+        return _connect()
+
+
+def _connect():
+    global _llm, _llm_provider
 
     # Try Ollama first
     logger.info(f"Attempting Ollama connection at {OLLAMA_BASE_URL}...")
@@ -76,6 +87,11 @@ def get_llm():
     )
 
 
+def get_llm_provider():
+    """Get the provider of the connected LLM, or None, without trying to connect."""
+    return _llm_provider
+
+
 def reset_llm():
     """Reset the LLM instance (for reconnection attempts)."""
     global _llm, _llm_provider
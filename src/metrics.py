@@ -0,0 +1,147 @@
+"""In-process latency histograms, exposed in the Prometheus text format.
+
+Recording an observation is a lock and a short bucket scan, so instrumentation
+can stay on hot paths.
+"""
+
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from a cached SQLite read to a slow local generation.
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 200)
+
+
+class Histogram:
+    """Cumulative histogram with optional labels."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), then the sum.
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def timed(self, **labels):
+        """Decorator observing the duration of each call."""
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def count(self, **labels):
+        """Number of observations for the given labels."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            return sum(series[:-1]) if series else 0
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            labels = [
+                f'{name}="{_escape(value)}"'
+                for name, value in zip(self.labelnames, key, strict=True)
+            ]
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series[:-1], strict=True):
+                cumulative += count
+                le = ",".join([*labels, f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{le}}} {cumulative}")
+            suffix = "{" + ",".join(labels) + "}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {series[-1]}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_registry: list[Histogram] = []
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    """Create and register a histogram."""
+    metric = Histogram(name, documentation, labelnames, buckets)
+    _registry.append(metric)
+    return metric
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+
+EMBEDDING_SECONDS = histogram(
+    "rag_embedding_seconds", "Time to embed texts with the embedding model.", ["kind"]
+)
+VECTOR_SEARCH_SECONDS = histogram("rag_vector_search_seconds", "Time of one Chroma query.")
+TIME_TO_FIRST_TOKEN_SECONDS = histogram(
+    "rag_time_to_first_token_seconds",
+    "Time from the start of a streamed answer to its first token, including retrieval.",
+)
+GENERATION_TOKENS_PER_SECOND = histogram(
+    "rag_generation_tokens_per_second",
+    "Estimated answer tokens per second after the first token.",
+    buckets=RATE_BUCKETS,
+)
+ASK_SECONDS = histogram("rag_ask_seconds", "Total time to answer a question.", ["mode"])
+INGEST_STAGE_SECONDS = histogram(
+    "rag_ingest_stage_seconds", "Time spent in each stage of an ingestion job.", ["stage"]
+)
+SQLITE_SECONDS = histogram(
+    "conversation_store_seconds", "Time of conversation store calls.", ["operation"]
+)
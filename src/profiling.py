@@ -0,0 +1,163 @@
+"""Opt-in profiling of single requests, stored under DATA_DIR/profiles.
+
+Requests are profiled when PROFILING_ENABLED is set and either the client sends
+an ``X-Profile`` header or the request is drawn at PROFILE_SAMPLE_RATE. Only one
+profile runs at a time. When disabled, deciding costs one boolean check.
+
+Two kinds of profile are written:
+
+* ``.prof``: cProfile stats of work running in one thread, e.g. an ingestion
+  job; open with ``pstats`` or snakeviz.
+* ``.folded``: a sampling profile of every thread in the process while an async
+  request runs, as collapsed stacks for flamegraph tools.
+"""
+
+import cProfile
+import logging
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from pathlib import Path
+
+from src.config import DATA_DIR, PROFILE_SAMPLE_RATE, PROFILING_ENABLED
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = Path(DATA_DIR) / "profiles"
+# Profiles kept on disk; the oldest are deleted first.
+MAX_PROFILES = 50
+SAMPLE_INTERVAL = 0.005
+
+_NAME = re.compile(r"^[\w.-]+\.(prof|folded)$")
+_busy = threading.Lock()
+
+
+def should_profile(header: str | None = None) -> bool:
+    """Whether to profile this request."""
+    if not PROFILING_ENABLED:
+        return False
+    if header and header.lower() not in ("0", "false", "no"):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _new_path(label: str, suffix: str) -> Path:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    return PROFILE_DIR / f"{stamp}-{label}-{uuid.uuid4().hex[:8]}.{suffix}"
+
+
+def _prune() -> None:
+    profiles = sorted(PROFILE_DIR.glob("*.*"), key=lambda p: p.stat().st_mtime)
+    for path in profiles[: max(len(profiles) - MAX_PROFILES, 0)]:
+        path.unlink(missing_ok=True)
+
+
+@contextmanager
+def _exclusive():
+    """Hold the single profiling slot, or yield False if another profile is running."""
+    acquired = _busy.acquire(blocking=False)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            _busy.release()
+
+
+@contextmanager
+def _cprofile(label: str):
+    with _exclusive() as acquired:
+        if not acquired:
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            path = _new_path(label, "prof")
+            profiler.dump_stats(path)
+            _prune()
+            logger.info("Wrote profile %s", path.name)
+
+
+def _stack(frame, thread_name: str) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join([thread_name, *reversed(names)])
+
+
+@contextmanager
+def _sample(label: str):
+    with _exclusive() as acquired:
+        if not acquired:
+            yield
+            return
+        counts: Counter[str] = Counter()
+        stop = threading.Event()
+
+        def run():
+            me = threading.get_ident()
+            while not stop.wait(SAMPLE_INTERVAL):
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident != me:
+                        counts[_stack(frame, names.get(ident, str(ident)))] += 1
+
+        sampler = threading.Thread(target=run, name="profile-sampler", daemon=True)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            sampler.join()
+            path = _new_path(label, "folded")
+            path.write_text("".join(f"{stack} {n}\n" for stack, n in counts.most_common()))
+            _prune()
+            logger.info("Wrote %.2fs sampling profile %s", time.perf_counter() - start, path.name)
+
+
+def profile_thread(label: str, enabled: bool):
+    """cProfile the with block, which must run in a single thread, if enabled."""
+    return _cprofile(label) if enabled else nullcontext()
+
+
+def profile_request(label: str, header: str | None = None):
+    """Sample every thread while the with block runs, if this request should be profiled."""
+    return _sample(label) if should_profile(header) else nullcontext()
+
+
+def list_profiles() -> list[dict]:
+    """Stored profiles, newest first."""
+    if not PROFILE_DIR.exists():
+        return []
+    profiles = [p for p in PROFILE_DIR.iterdir() if _NAME.match(p.name)]
+    profiles.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+    return [
+        {
+            "name": p.name,
+            "kind": p.suffix[1:],
+            "bytes": p.stat().st_size,
+            "created_at": datetime.fromtimestamp(p.stat().st_mtime, timezone.utc).isoformat(),
+        }
+        for p in profiles
+    ]
+
+
+def get_profile_path(name: str) -> Path | None:
+    """Path of a stored profile, or None if the name is not one."""
+    if not _NAME.match(name):
+        return None
+    path = PROFILE_DIR / name
+    return path if path.is_file() else None
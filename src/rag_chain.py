@@ -1,11 +1,25 @@
+import asyncio
 import logging
+import time
 
-from langchain_classic.chains import create_retrieval_chain
-from langchain_classic.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 
+from src import tracing
+from src.config import BATCH_MAX_CONCURRENCY, PROMPT_TOKEN_BUDGET
+from src.context_packer import estimate_tokens, pack_documents
 from src.llm import get_llm
-from src.vector_store import get_retriever
+from src.metrics import (
+    ASK_SECONDS,
+    GENERATION_TOKENS_PER_SECOND,
+    TIME_TO_FIRST_TOKEN_SECONDS,
+)
+from src.vector_store import (
+    get_corpus_version,
+    get_retriever,
+    get_vector_store,
+    retrieve_batch,
+)
 
 SYSTEM_PROMPT = """Answer based on the context below. Be concise. If the context lacks the answer, say so.
 
@@ -17,30 +31,86 @@ Chat history:
 
 logger = logging.getLogger(__name__)
 
+# Chains are cached together with the LLM / vector store instances they were built
+# from, and rebuilt only when those change (after reset_llm or clear_store).
 _rag_chain = None
+_rag_chain_deps: tuple = ()
+_document_chain = None
+_document_chain_llm = None
 
 
-def _format_chat_history(history, max_turns=3):
-    """Format recent chat history as a string for the prompt."""
-    if not history:
+def _format_chat_history(history, max_turns=3, summary=None):
+    """Format recent chat history, preceded by the rolling summary, for the prompt."""
+    if not history and not summary:
         return "No previous conversation."
 
-    recent = history[-max_turns:]
+    recent = (history or [])[-max_turns:]
     formatted = []
+    if summary:
+        formatted.append(f"Summary of earlier conversation: {summary}")
     for msg in recent:
         role = "User" if msg["role"] == "user" else "Assistant"
         formatted.append(f"{role}: {msg['content']}")
     return "\n".join(formatted)
 
 
-def get_rag_chain():
-    """Create the RAG chain."""
-    global _rag_chain
-    if _rag_chain is not None:
-        return _rag_chain
+def _pack_context(inputs):
+    """Trim retrieved documents to the tokens left after prompt, history and question."""
+    overhead = (
+        estimate_tokens(SYSTEM_PROMPT)
+        + estimate_tokens(inputs.get("chat_history", ""))
+        + estimate_tokens(inputs["input"])
+    )
+    with tracing.span("context_packing", budget=PROMPT_TOKEN_BUDGET - overhead) as span:
+        packed = pack_documents(inputs["context"], PROMPT_TOKEN_BUDGET - overhead)
+        span.set(documents=len(packed))
+    return packed
+
+
+def estimate_prompt_tokens(question, chat_history, context_docs, summary=None):
+    """Estimate the prompt tokens sent to the LLM for a question."""
+    context = "\n\n".join(doc.page_content for doc in context_docs)
+    return (
+        estimate_tokens(SYSTEM_PROMPT)
+        + estimate_tokens(_format_chat_history(chat_history or [], summary=summary))
+        + estimate_tokens(question)
+        + estimate_tokens(context)
+    )
+
+
+def _retrieved_k(context_docs):
+    """Number of chunks the retriever chose, before context packing."""
+    if not context_docs:
+        return 0
+    return context_docs[0].metadata.get("retrieved_k", len(context_docs))
 
+
+def coalescing_key(question, chat_history=None, summary=None):
+    """Key under which identical concurrent questions can share one answer.
+
+    Questions match after case, whitespace and trailing punctuation are normalized,
+    as long as the corpus and the conversation context are the same.
+    """
+    normalized = " ".join(question.lower().split()).rstrip("?!. ")
+    history = _format_chat_history(chat_history or [], summary=summary)
+    return normalized, get_corpus_version(), history
+
+
+def _same_instances(built_from, current):
+    """Whether a cached chain was built from exactly the current instances."""
+    return len(built_from) == len(current) and all(
+        a is b for a, b in zip(built_from, current, strict=True)
+    )
+
+
+def get_document_chain():
+    """Create the stuff-documents chain that answers from already retrieved context."""
+    global _document_chain, _document_chain_llm
     llm, _ = get_llm()
-    retriever = get_retriever()
+    if _document_chain is not None and _document_chain_llm is llm:
+        return _document_chain
+
+    from langchain_classic.chains.combine_documents import create_stuff_documents_chain
 
     prompt = ChatPromptTemplate.from_messages(
         [
@@ -49,12 +119,45 @@ def get_rag_chain():
         ]
     )
 
-    document_chain = create_stuff_documents_chain(llm, prompt)
-    _rag_chain = create_retrieval_chain(retriever, document_chain)
+    _document_chain = create_stuff_documents_chain(llm, prompt)
+    _document_chain_llm = llm
+    return _document_chain
+
+
+def get_rag_chain():
+    """Create the RAG chain.
+
+    Ingestion never invalidates the chain: the retriever searches the live
+    collection, so new documents are visible to the next question at no cost.
+    """
+    global _rag_chain, _rag_chain_deps
+    document_chain = get_document_chain()
+    store = get_vector_store()
+    if _rag_chain is not None and _same_instances(_rag_chain_deps, (document_chain, store)):
+        return _rag_chain
+
+    from langchain_classic.chains import create_retrieval_chain
+
+    retriever = get_retriever()
+
+    retrieve_and_pack = RunnablePassthrough.assign(
+        context=(lambda x: x["input"]) | retriever
+    ) | RunnableLambda(_pack_context)
+
+    _rag_chain = create_retrieval_chain(retrieve_and_pack, document_chain)
+    _rag_chain_deps = (document_chain, store)
     logger.info("RAG chain created successfully")
     return _rag_chain
 
 
+def _observe_stream(start, first_token_at, answer):
+    """Record latency metrics of a completed streamed answer."""
+    end = time.perf_counter()
+    ASK_SECONDS.observe(end - start, mode="stream")
+    if first_token_at is not None and end > first_token_at:
+        GENERATION_TOKENS_PER_SECOND.observe(estimate_tokens(answer) / (end - first_token_at))
+
+
 def _extract_sources(docs):
     """Extract source information from retrieved documents."""
     sources = []
@@ -74,14 +177,17 @@ def _extract_sources(docs):
             source_info["name"] = meta.get("source", "Unknown")
         if "page" in meta:
             source_info["page"] = meta["page"]
+        if "score" in meta:
+            source_info["score"] = meta["score"]
         sources.append(source_info)
     return sources
 
 
-def ask_question(question, chat_history=None):
+@ASK_SECONDS.timed(mode="invoke")
+def ask_question(question, chat_history=None, summary=None):
     """Ask a question and get an answer with sources."""
     chain = get_rag_chain()
-    formatted_history = _format_chat_history(chat_history or [])
+    formatted_history = _format_chat_history(chat_history or [], summary=summary)
 
     result = chain.invoke(
         {
@@ -90,19 +196,26 @@ def ask_question(question, chat_history=None):
         }
     )
 
+    context_docs = result.get("context", [])
     return {
         "answer": result["answer"],
-        "sources": _extract_sources(result.get("context", [])),
+        "sources": _extract_sources(context_docs),
+        "prompt_tokens": estimate_prompt_tokens(question, chat_history, context_docs, summary),
+        "k": _retrieved_k(context_docs),
+        "context_docs": context_docs,
     }
 
 
-def ask_question_stream(question, chat_history=None):
+def ask_question_stream(question, chat_history=None, summary=None):
     """Ask a question with streaming response. Yields (chunk_text, sources, context_docs) tuples."""
+    start = time.perf_counter()
     chain = get_rag_chain()
-    formatted_history = _format_chat_history(chat_history or [])
+    formatted_history = _format_chat_history(chat_history or [], summary=summary)
 
     sources = []
     context_docs = []
+    first_token_at = None
+    answer = []
     for chunk in chain.stream(
         {
             "input": question,
@@ -113,10 +226,130 @@ def ask_question_stream(question, chat_history=None):
             context_docs = chunk["context"]
             sources = _extract_sources(context_docs)
         if "answer" in chunk:
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+                TIME_TO_FIRST_TOKEN_SECONDS.observe(first_token_at - start)
+            answer.append(chunk["answer"])
             yield chunk["answer"], sources, context_docs
+    _observe_stream(start, first_token_at, "".join(answer))
+
+
+async def aask_question(question, chat_history=None, summary=None):
+    """Async counterpart of ask_question built on the chain's ainvoke."""
+    start = time.perf_counter()
+    chain = await asyncio.to_thread(get_rag_chain)
+    formatted_history = _format_chat_history(chat_history or [], summary=summary)
+
+    result = await chain.ainvoke(
+        {
+            "input": question,
+            "chat_history": formatted_history,
+        }
+    )
+
+    context_docs = result.get("context", [])
+    ASK_SECONDS.observe(time.perf_counter() - start, mode="invoke")
+    packing = tracing.find_span("context_packing")
+    if packing is not None:
+        tracing.record_span("llm_generate", packing.end_ns, answer_chars=len(result["answer"]))
+    return {
+        "answer": result["answer"],
+        "sources": _extract_sources(context_docs),
+        "prompt_tokens": estimate_prompt_tokens(question, chat_history, context_docs, summary),
+        "k": _retrieved_k(context_docs),
+        "context_docs": context_docs,
+    }
+
+
+async def aask_question_stream(question, chat_history=None, summary=None):
+    """Async counterpart of ask_question_stream. Yields (chunk_text, sources, context_docs) tuples.
+
+    The first tuple has empty text and is yielded as soon as retrieval is done,
+    so callers can show the sources while the LLM is still reading the prompt.
+    """
+    start = time.perf_counter()
+    chain = await asyncio.to_thread(get_rag_chain)
+    formatted_history = _format_chat_history(chat_history or [], summary=summary)
+
+    sources = []
+    context_docs = []
+    first_token_at = None
+    answer = []
+    context_at = None
+    async for chunk in chain.astream(
+        {
+            "input": question,
+            "chat_history": formatted_history,
+        }
+    ):
+        if "context" in chunk:
+            context_docs = chunk["context"]
+            sources = _extract_sources(context_docs)
+            context_at = time.time_ns()
+            yield "", sources, context_docs
+        if "answer" in chunk:
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+                TIME_TO_FIRST_TOKEN_SECONDS.observe(first_token_at - start)
+            answer.append(chunk["answer"])
+            yield chunk["answer"], sources, context_docs
+    _observe_stream(start, first_token_at, "".join(answer))
+    if context_at is not None:
+        tracing.record_span("llm_stream", context_at, chunks=len(answer))
+
+
+async def ask_questions(questions, max_concurrency=BATCH_MAX_CONCURRENCY):
+    """Answer independent questions in bulk, yielding results as they complete.
+
+    Retrieval for the whole batch is one embedding call and one vector search;
+    generations then run with at most max_concurrency in flight. Each result
+    carries the question's index in the input list.
+    """
+    contexts = await asyncio.to_thread(retrieve_batch, questions)
+    chain = await asyncio.to_thread(get_document_chain)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    formatted_history = _format_chat_history([])
+
+    async def answer(index, question, docs):
+        async with semaphore:
+            start = time.time()
+            inputs = {"input": question, "chat_history": formatted_history}
+            context_docs = _pack_context({**inputs, "context": docs})
+            try:
+                answer_text = await chain.ainvoke({**inputs, "context": context_docs})
+            except Exception as e:
+                logger.error("Batch question %d failed: %s", index, e)
+                return {"index": index, "question": question, "error": str(e)}
+            ASK_SECONDS.observe(time.time() - start, mode="batch")
+            return {
+                "index": index,
+                "question": question,
+                "answer": answer_text,
+                "sources": _extract_sources(context_docs),
+                "prompt_tokens": estimate_prompt_tokens(question, None, context_docs),
+                "k": _retrieved_k(context_docs),
+                "response_time": round(time.time() - start, 2),
+            }
+
+    tasks = [
+        asyncio.create_task(answer(i, question, docs))
+        for i, (question, docs) in enumerate(zip(questions, contexts, strict=True))
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
 
 
 def reset_chain():
-    """Reset the RAG chain (e.g., after clearing documents)."""
-    global _rag_chain
+    """Force the RAG chain to be rebuilt on next use.
+
+    Not needed after ingesting or clearing documents, or after reset_llm.
+    """
+    global _rag_chain, _rag_chain_deps, _document_chain, _document_chain_llm
     _rag_chain = None
+    _rag_chain_deps = ()
+    _document_chain = None
+    _document_chain_llm = None
@@ -0,0 +1,182 @@
+"""Retention of old conversations: archival, bounded deletes and space reclamation.
+
+Expired conversations are written to gzip-compressed NDJSON segments under
+``ARCHIVE_DIR`` (one conversation per line) and then deleted in transactions of
+at most ``RETENTION_BATCH_SIZE`` conversations, so live writes only ever wait for
+one short batch. Freed pages are returned to the filesystem with incremental
+vacuum.
+
+Databases created before incremental vacuum was enabled reuse freed pages but
+never return them; convert one offline, with the API stopped, using::
+
+    python -m src.retention --enable-incremental-vacuum
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from src import conversation_store as cs
+from src.config import (
+    DATA_DIR,
+    RETENTION_BATCH_SIZE,
+    RETENTION_INTERVAL_MINUTES,
+    RETENTION_MAX_AGE_DAYS,
+    RETENTION_MAX_DB_MB,
+)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = Path(DATA_DIR) / "archive"
+# Pause between batches, leaving the write lock to live traffic.
+BATCH_PAUSE = 0.05
+# Free pages returned to the filesystem per vacuum transaction.
+VACUUM_PAGES = 1000
+
+_stop = threading.Event()
+_thread: threading.Thread | None = None
+_warned_no_vacuum = False
+
+
+def write_segment(conversations: list[dict]) -> Path:
+    """Write conversations to a new compressed NDJSON archive segment."""
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    path = ARCHIVE_DIR / f"conversations-{stamp}-{uuid.uuid4().hex[:8]}.ndjson.gz"
+    tmp = path.with_name(path.name + ".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        for conversation in conversations:
+            f.write(json.dumps(conversation, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+    return path
+
+
+def read_segment(path: Path) -> list[dict]:
+    """Read the conversations stored in an archive segment."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def _archive_and_delete(ids: list[int]) -> int:
+    """Archive conversations, then delete them. Returns how many were deleted.
+
+    Conversations written to after the export are kept, so no message is
+    deleted without being archived; a later pass archives them again in full.
+    """
+    conversations = cs.export_conversations(ids)
+    write_segment(conversations)
+    deleted = cs.delete_unchanged_conversations(conversations)
+    time.sleep(BATCH_PAUSE)
+    return deleted
+
+
+def run_retention(
+    max_age_days: int = RETENTION_MAX_AGE_DAYS,
+    max_db_mb: int = RETENTION_MAX_DB_MB,
+    batch_size: int = RETENTION_BATCH_SIZE,
+) -> dict:
+    """Apply the age and size policies once, then reclaim the space freed.
+
+    Returns counts of archived conversations, swept source previews and
+    vacuumed pages.
+    """
+    global _warned_no_vacuum
+    archived = 0
+    if max_age_days > 0:
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=max_age_days)).strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
+        while ids := cs.oldest_conversations(batch_size, active_before=cutoff):
+            archived += _archive_and_delete(ids)
+            if _stop.is_set():
+                break
+    if max_db_mb > 0:
+        while cs.database_size() > max_db_mb * 1024 * 1024 and not _stop.is_set():
+            ids = cs.oldest_conversations(batch_size)
+            if not ids:
+                break
+            archived += _archive_and_delete(ids)
+
+    swept = cs.sweep_source_previews() if archived else 0
+    vacuumed = 0
+    if cs.incremental_vacuum_enabled():
+        while (pages := cs.incremental_vacuum(VACUUM_PAGES)) and not _stop.is_set():
+            vacuumed += pages
+            time.sleep(BATCH_PAUSE)
+    elif not _warned_no_vacuum:
+        _warned_no_vacuum = True
+        logger.warning(
+            "%s does not use incremental vacuum, so freed space is not returned to the "
+            "filesystem; stop the API and run python -m src.retention "
+            "--enable-incremental-vacuum to convert it",
+            cs.DB_PATH,
+        )
+
+    if archived or vacuumed:
+        logger.info(
+            "Retention archived %d conversations, swept %d previews, vacuumed %d pages",
+            archived,
+            swept,
+            vacuumed,
+        )
+    return {"archived": archived, "previews_swept": swept, "pages_vacuumed": vacuumed}
+
+
+def _loop() -> None:
+    while not _stop.is_set():
+        try:
+            run_retention()
+        except Exception:
+            logger.exception("Conversation retention failed")
+        _stop.wait(RETENTION_INTERVAL_MINUTES * 60)
+
+
+def start() -> bool:
+    """Run retention in a background thread if a policy is enabled."""
+    global _thread
+    if not (RETENTION_MAX_AGE_DAYS > 0 or RETENTION_MAX_DB_MB > 0):
+        return False
+    if _thread is None or not _thread.is_alive():
+        _stop.clear()
+        _thread = threading.Thread(target=_loop, name="conversation-retention", daemon=True)
+        _thread.start()
+    return True
+
+
+def stop() -> None:
+    """Stop the background retention thread, finishing at most its current batch."""
+    global _thread
+    if _thread is not None:
+        _stop.set()
+        _thread.join()
+        _thread = None
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Conversation retention and maintenance.")
+    parser.add_argument(
+        "--enable-incremental-vacuum",
+        action="store_true",
+        help="convert the database to incremental vacuum (full VACUUM; stop the API first)",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    try:
+        if args.enable_incremental_vacuum:
+            if not cs.enable_incremental_vacuum():
+                print(f"{cs.DB_PATH} already uses incremental vacuum")
+        else:
+            print(run_retention())
+    finally:
+        cs.close()
+
+
+if __name__ == "__main__":
+    main()
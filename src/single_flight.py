@@ -0,0 +1,105 @@
+"""Coalescing of identical concurrent computations (single-flight)."""
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _Broadcast:
+    """Fan one async iterator out to any number of subscribers, replaying missed items."""
+
+    def __init__(self, source, on_finish):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self._on_finish = on_finish
+        self._task = asyncio.ensure_future(self._produce(source))
+
+    async def _produce(self, source):
+        try:
+            async for item in source:
+                self.items.append(item)
+                self._notify()
+        except asyncio.CancelledError:
+            self.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+            self._on_finish()
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self):
+        self.subscribers += 1
+        position = 0
+        try:
+            while True:
+                changed = self._changed
+                while position < len(self.items):
+                    yield self.items[position]
+                    position += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                logger.info("All subscribers left, cancelling shared stream")
+                self._task.cancel()
+
+
+class SingleFlight:
+    """Share one in-flight computation among concurrent callers with the same key.
+
+    A computation keeps running while at least one caller is waiting on it; for
+    streams, callers that join late first receive every item produced so far.
+    """
+
+    def __init__(self):
+        self._calls: dict = {}
+        self._streams: dict = {}
+
+    def in_flight(self, key):
+        """Whether a computation for key is currently running."""
+        return key in self._calls or key in self._streams
+
+    async def do(self, key, func):
+        """Await func() once for all concurrent callers with the same key."""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish_call(key, done))
+        return await asyncio.shield(task)
+
+    def _finish_call(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved when every caller has gone away.
+
+    async def stream(self, key, func):
+        """Iterate func() once for all concurrent callers with the same key."""
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast(func(), lambda: self._finish_stream(key, broadcast))
+            self._streams[key] = broadcast
+        async for item in broadcast.subscribe():
+            yield item
+
+    def _finish_stream(self, key, broadcast):
+        if self._streams.get(key) is broadcast:
+            del self._streams[key]
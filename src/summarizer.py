@@ -0,0 +1,76 @@
+"""Rolling per-conversation summaries that keep the prompt size flat.
+
+Summaries are refreshed in the background after each answer. The refresh is
+async so that its LLM call does not hold one of the server's request threads.
+"""
+
+import asyncio
+import logging
+import threading
+
+from src import conversation_store as cs
+from src.config import SUMMARY_TOKEN_BUDGET
+from src.context_packer import trim_to_sentences
+from src.llm import get_llm
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """Update the running summary of a conversation with the new messages. \
+Keep facts, names and numbers needed for follow-up questions. Reply with the summary only, \
+in at most {max_words} words.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}"""
+
+# Messages of the latest turn stay verbatim in the prompt, not in the summary.
+LAST_TURN_MESSAGES = 2
+
+_in_progress: set[int] = set()
+_lock = threading.Lock()
+
+
+async def asummarize(previous_summary, messages):
+    """Fold messages into the previous summary using the LLM."""
+    llm, _ = get_llm()
+    formatted = "\n".join(
+        f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}" for msg in messages
+    )
+    prompt = SUMMARY_PROMPT.format(
+        max_words=SUMMARY_TOKEN_BUDGET * 3 // 4,
+        summary=previous_summary or "None yet.",
+        messages=formatted,
+    )
+    result = await llm.ainvoke(prompt)
+    text = getattr(result, "content", result).strip()
+    return trim_to_sentences(text, SUMMARY_TOKEN_BUDGET) or text[: SUMMARY_TOKEN_BUDGET * 4]
+
+
+async def arefresh_summary(conversation_id):
+    """Fold every message older than the latest turn into the conversation summary.
+
+    Safe to call after each turn: concurrent calls for the same conversation are
+    skipped, and whatever they would have folded is picked up by the next call.
+    """
+    with _lock:
+        if conversation_id in _in_progress:
+            return
+        _in_progress.add(conversation_id)
+    try:
+        unsummarized = await asyncio.to_thread(cs.get_unsummarized_messages, conversation_id)
+        pending = unsummarized[:-LAST_TURN_MESSAGES]
+        if not pending:
+            return
+        previous = await asyncio.to_thread(cs.get_summary, conversation_id)
+        summary = await asummarize(previous, pending)
+        await asyncio.to_thread(cs.update_summary, conversation_id, summary, pending[-1]["id"])
+        logger.info(
+            "Folded %d messages into summary of conversation %d", len(pending), conversation_id
+        )
+    except Exception as e:
+        logger.warning("Failed to update summary of conversation %d: %s", conversation_id, e)
+    finally:
+        with _lock:
+            _in_progress.discard(conversation_id)
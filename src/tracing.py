@@ -0,0 +1,200 @@
+"""Sampled per-request tracing, exported as OTLP JSON lines to a rotating file.
+
+A request opened with ``trace()`` collects the spans created by ``span()``
+anywhere below it, including in worker threads started with a copy of the
+context. When it ends, the whole trace is written as one OTLP/JSON
+``ExportTraceServiceRequest`` per line. Requests that are not sampled only pay
+for one random draw; every ``span()`` under them is a no-op.
+"""
+
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from src.config import DATA_DIR, TRACE_FILE_MAX_MB, TRACE_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+TRACE_FILE = Path(DATA_DIR) / "traces" / "spans.jsonl"
+TRACE_FILE_BACKUPS = 3
+SERVICE_NAME = "langchain-ai-assistant"
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name, parent_id=None, attributes=None, start_ns=None):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+
+    def set(self, **attributes):
+        """Add attributes to the span."""
+        self.attributes.update(attributes)
+
+
+class _NoopSpan:
+    """Stand-in for spans of requests that are not sampled."""
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _Trace:
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans = []
+
+
+_current_trace: ContextVar[_Trace | None] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+_exporter: logging.Logger | None = None
+
+
+@contextmanager
+def trace(name, sample_rate=None, start_ns=None, **attributes):
+    """Open a sampled trace whose root span covers the with block.
+
+    Pass start_ns to start the root span earlier, e.g. when the request began
+    before the code that opens the trace.
+    """
+    rate = TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate <= 0 or random.random() >= rate:
+        yield _NOOP
+        return
+    current = _Trace()
+    root = Span(name, attributes=attributes, start_ns=start_ns)
+    trace_token = _current_trace.set(current)
+    span_token = _current_span.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.error = str(e) or type(e).__name__
+        raise
+    finally:
+        root.end_ns = time.time_ns()
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        current.spans.append(root)
+        _export(current)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time the with block as a child of the current span, if the request is traced."""
+    current = _current_trace.get()
+    if current is None:
+        yield _NOOP
+        return
+    parent = _current_span.get()
+    child = Span(name, parent.span_id if parent else None, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = str(e) or type(e).__name__
+        raise
+    finally:
+        child.end_ns = time.time_ns()
+        _current_span.reset(token)
+        current.spans.append(child)
+
+
+def record_span(name, start_ns, end_ns=None, **attributes):
+    """Add an already finished operation as a child of the current span."""
+    current = _current_trace.get()
+    if current is None:
+        return
+    parent = _current_span.get()
+    child = Span(name, parent.span_id if parent else None, attributes, start_ns)
+    child.end_ns = end_ns or time.time_ns()
+    current.spans.append(child)
+
+
+def find_span(name):
+    """The most recently finished span with this name in the current trace, or None."""
+    current = _current_trace.get()
+    if current is None:
+        return None
+    return next((s for s in reversed(current.spans) if s.name == name), None)
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def to_otlp(trace_id, spans):
+    """Encode spans as an OTLP/JSON ExportTraceServiceRequest."""
+    encoded = []
+    for s in spans:
+        item = {
+            "traceId": trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 1,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": [_attribute(k, v) for k, v in s.attributes.items() if v is not None],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        }
+        if s.parent_id:
+            item["parentSpanId"] = s.parent_id
+        encoded.append(item)
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": encoded}],
+            }
+        ]
+    }
+
+
+def _get_exporter():
+    global _exporter
+    if _exporter is None:
+        TRACE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(
+            TRACE_FILE,
+            maxBytes=TRACE_FILE_MAX_MB * 1024 * 1024,
+            backupCount=TRACE_FILE_BACKUPS,
+            encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        exporter = logging.getLogger(f"{__name__}.export")
+        exporter.handlers = [handler]
+        exporter.setLevel(logging.INFO)
+        exporter.propagate = False
+        _exporter = exporter
+    return _exporter
+
+
+def _export(current):
+    try:
+        line = json.dumps(to_otlp(current.trace_id, current.spans), separators=(",", ":"))
+        _get_exporter().info(line)
+    except Exception as e:
+        logger.warning("Failed to export trace %s: %s", current.trace_id, e)
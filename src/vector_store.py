@@ -1,31 +1,56 @@
 import logging
-
-from langchain_chroma import Chroma
-
-from src.config import CHROMA_DB_DIR, TOP_K_RESULTS
-from src.embeddings import get_embeddings
+import threading
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+from src import tracing
+from src.config import (
+    CHROMA_DB_DIR,
+    RETRIEVAL_INCLUDE_EMBEDDINGS,
+    RETRIEVAL_MAX_K,
+    RETRIEVAL_MIN_K,
+    RETRIEVAL_MIN_SCORE,
+    RETRIEVAL_SCORE_GAP,
+    TOP_K_RESULTS,
+)
+from src.embeddings import embed_documents, embed_query, get_embeddings
+from src.metrics import VECTOR_SEARCH_SECONDS
 
 logger = logging.getLogger(__name__)
 
 _vector_store = None
+_lock = threading.Lock()
+# Bumped whenever the stored chunks change, so cached or shared answers can be keyed on it.
+_corpus_version = 0
+# Document count and sources, cached for the corpus version they were computed at.
+_stats: tuple[int, dict] | None = None
 
 
 def get_vector_store():
     """Get or create the ChromaDB vector store (singleton)."""
     global _vector_store
     if _vector_store is None:
-        _vector_store = Chroma(
-            collection_name="documents",
-            embedding_function=get_embeddings(),
-            persist_directory=CHROMA_DB_DIR,
-        )
+        with _lock:
+            if _vector_store is None:
+                from langchain_chroma import Chroma
+
+                _vector_store = Chroma(
+                    collection_name="documents",
+                    embedding_function=get_embeddings(),
+                    persist_directory=CHROMA_DB_DIR,
+                )
     return _vector_store
 
 
 def add_documents(chunks):
     """Add document chunks to the vector store."""
+    global _corpus_version
     store = get_vector_store()
     store.add_documents(chunks)
+    _corpus_version += 1
     logger.info(f"Added {len(chunks)} chunks to vector store")
     return len(chunks)
 
@@ -38,12 +63,130 @@ def search(query, k=None):
     return store.similarity_search(query, k=k)
 
 
-def get_retriever(k=None):
-    """Get a retriever for the RAG chain."""
+def search_with_scores(query, k=None):
+    """Search for similar documents, returning (document, relevance score) pairs."""
     if k is None:
         k = TOP_K_RESULTS
     store = get_vector_store()
-    return store.as_retriever(search_kwargs={"k": k})
+    return store.similarity_search_with_relevance_scores(query, k=k)
+
+
+def select_by_score(docs_and_scores, min_score, max_gap, min_k=1):
+    """Cut a ranked result list where scores fall below min_score or drop by more than max_gap.
+
+    The first min_k results are always kept. Returns the kept documents with their
+    score and the chosen k recorded in metadata.
+    """
+    selected = []
+    previous = None
+    for doc, score in docs_and_scores:
+        if len(selected) >= min_k and (
+            score < min_score or (previous is not None and previous - score > max_gap)
+        ):
+            break
+        selected.append(doc)
+        previous = score
+        doc.metadata["score"] = round(float(score), 4)
+    for doc in selected:
+        doc.metadata["retrieved_k"] = len(selected)
+    return selected
+
+
+def _query_collection(store, vectors, k, include_embeddings=False):
+    """Search the collection for each query vector in one call.
+
+    Returns one ranked list of (document, relevance score) pairs per vector. With
+    include_embeddings, each document's stored vector is added to its metadata.
+    """
+    include = ["documents", "metadatas", "distances"]
+    if include_embeddings:
+        include.append("embeddings")
+    with VECTOR_SEARCH_SECONDS.time():
+        results = store._collection.query(query_embeddings=vectors, n_results=k, include=include)
+    relevance = store._select_relevance_score_fn()
+    embeddings = results.get("embeddings") if include_embeddings else None
+
+    per_query = []
+    for i, (texts, metadatas, distances) in enumerate(
+        zip(results["documents"], results["metadatas"], results["distances"], strict=True)
+    ):
+        docs_and_scores = []
+        for j, (text, meta, distance) in enumerate(zip(texts, metadatas, distances, strict=True)):
+            metadata = dict(meta or {})
+            if embeddings is not None:
+                metadata["embedding"] = [float(x) for x in embeddings[i][j]]
+            docs_and_scores.append(
+                (Document(page_content=text, metadata=metadata), relevance(distance))
+            )
+        per_query.append(docs_and_scores)
+    return per_query
+
+
+class AdaptiveRetriever(BaseRetriever):
+    """Retriever that returns a per-query number of chunks based on relevance scores.
+
+    Each document carries its relevance ``score`` (and, optionally, its stored
+    ``embedding``) in metadata, so later stages never need to recompute them.
+    """
+
+    vectorstore: VectorStore
+    max_k: int = RETRIEVAL_MAX_K
+    min_k: int = RETRIEVAL_MIN_K
+    min_score: float = RETRIEVAL_MIN_SCORE
+    max_gap: float = RETRIEVAL_SCORE_GAP
+    include_embeddings: bool = RETRIEVAL_INCLUDE_EMBEDDINGS
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        with tracing.span("retrieval", max_k=self.max_k) as span:
+            vector = embed_query(query, self.vectorstore.embeddings)
+            [docs_and_scores] = _query_collection(
+                self.vectorstore, [vector], self.max_k, self.include_embeddings
+            )
+            docs = select_by_score(docs_and_scores, self.min_score, self.max_gap, self.min_k)
+            span.set(k=len(docs))
+        return docs
+
+
+def get_retriever(k=None):
+    """Get a retriever for the RAG chain, fetching at most k (RETRIEVAL_MAX_K) chunks."""
+    if k is None:
+        k = RETRIEVAL_MAX_K
+    store = get_vector_store()
+    return AdaptiveRetriever(vectorstore=store, max_k=k)
+
+
+def retrieve_batch(queries, k=None):
+    """Retrieve adaptive top-k chunks for many queries at once.
+
+    All queries are embedded in one batched call and searched in one collection
+    query, then each result list is cut by score like AdaptiveRetriever.
+    """
+    if k is None:
+        k = RETRIEVAL_MAX_K
+    if not queries:
+        return []
+    store = get_vector_store()
+    vectors = embed_documents(list(queries), get_embeddings())
+    return [
+        select_by_score(docs_and_scores, RETRIEVAL_MIN_SCORE, RETRIEVAL_SCORE_GAP, RETRIEVAL_MIN_K)
+        for docs_and_scores in _query_collection(store, vectors, k, RETRIEVAL_INCLUDE_EMBEDDINGS)
+    ]
+
+
+def get_corpus_version():
+    """Get a counter that changes whenever documents are added or cleared."""
+    return _corpus_version
+
+
+def get_store_stats():
+    """Get the chunk count and sources, recomputed only after documents change."""
+    global _stats
+    version = _corpus_version
+    if _stats is None or _stats[0] != version:
+        _stats = (version, {"documents": get_document_count(), "sources": list_sources()})
+    return _stats[1]
 
 
 def get_document_count():
@@ -67,8 +210,9 @@ def list_sources():
 
 def clear_store():
     """Clear all documents from the vector store."""
-    global _vector_store
+    global _vector_store, _corpus_version
     store = get_vector_store()
     store._collection.delete(where={"chunk_index": {"$gte": 0}})
     _vector_store = None
+    _corpus_version += 1
     logger.info("Cleared all documents from vector store")
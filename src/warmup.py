@@ -0,0 +1,77 @@
+"""Startup warm-up of the embedding model, vector store and LLM.
+
+Each component is loaded in its own thread and exercised once, so the first
+user request does not pay for model loading:
+
+* embeddings: load the model and embed a dummy query;
+* vector_store: open the Chroma collection, cache its stats and, if it holds
+  chunks, run one search so the index is read into memory;
+* llm: connect, which for Ollama already generates a reply and so loads the
+  model; other providers are sent one short prompt.
+
+The vector store needs the embedding model, so it finishes after it; the LLM
+loads alongside both. A component that fails is logged and left to load lazily
+on first use.
+"""
+
+import asyncio
+import logging
+import time
+
+from src.config import WARMUP_ENABLED
+from src.embeddings import embed_query
+from src.llm import get_llm
+from src.vector_store import get_store_stats, search
+
+logger = logging.getLogger(__name__)
+
+WARMUP_TEXT = "Hi"
+
+
+def _warm_embeddings():
+    embed_query(WARMUP_TEXT)
+
+
+def _warm_vector_store():
+    if get_store_stats()["documents"]:
+        search(WARMUP_TEXT, k=1)
+
+
+def _warm_llm():
+    llm, provider = get_llm()
+    if provider != "ollama":
+        llm.invoke(WARMUP_TEXT)
+
+
+COMPONENTS = {
+    "embeddings": _warm_embeddings,
+    "vector_store": _warm_vector_store,
+    "llm": _warm_llm,
+}
+
+
+def _timed(name, warm) -> float | None:
+    start = time.perf_counter()
+    try:
+        warm()
+    except Exception as e:
+        logger.warning("Warm-up of %s failed after %.2fs: %s", name, time.perf_counter() - start, e)
+        return None
+    seconds = time.perf_counter() - start
+    logger.info("Warmed up %s in %.2fs", name, seconds)
+    return seconds
+
+
+async def warm_up() -> dict[str, float | None]:
+    """Warm up every component in parallel, if enabled.
+
+    Returns the seconds each took, or None for those that failed.
+    """
+    if not WARMUP_ENABLED:
+        return {}
+    start = time.perf_counter()
+    durations = await asyncio.gather(
+        *(asyncio.to_thread(_timed, name, warm) for name, warm in COMPONENTS.items())
+    )
+    logger.info("Warm-up finished in %.2fs", time.perf_counter() - start)
+    return dict(zip(COMPONENTS, durations, strict=True))
@@ -1,16 +1,22 @@
+import asyncio
+import json
 import tempfile
+import threading
+import time
 from io import BytesIO
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from fastapi.testclient import TestClient
+from langchain_core.documents import Document
 
 import src.conversation_store as cs
+from src import profiling, tracing
 
 # Patch LLM before importing api module
 with patch("src.llm.get_llm", return_value=(MagicMock(), "mock")):
-    from api import app
+    from api import QuestionRequest, app, ask, ask_stream
 
 
 @pytest.fixture(autouse=True)
@@ -32,9 +38,8 @@ def client():
 
 def test_health_endpoint(client):
     with (
-        patch("api.get_llm", return_value=(MagicMock(), "ollama")),
-        patch("api.get_document_count", return_value=5),
-        patch("api.list_sources", return_value=["doc.pdf"]),
+        patch("api.get_llm_provider", return_value="ollama"),
+        patch("api.get_store_stats", return_value={"documents": 5, "sources": ["doc.pdf"]}),
     ):
         resp = client.get("/health")
         assert resp.status_code == 200
@@ -44,18 +49,72 @@ def test_health_endpoint(client):
         assert data["documents"] == 5
 
 
-def test_list_documents(client):
+def test_health_does_not_connect_llm(client):
     with (
-        patch("api.get_document_count", return_value=10),
-        patch("api.list_sources", return_value=["a.pdf", "b.txt"]),
+        patch("api.get_llm") as get_llm,
+        patch("api.get_llm_provider", return_value=None),
+        patch("api.get_store_stats", return_value={"documents": 0, "sources": []}),
     ):
+        assert client.get("/health").json()["llm"] == "disconnected"
+    get_llm.assert_not_called()
+
+
+def _wait_until_ready(client, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while (resp := client.get("/readyz")).status_code != 200:
+        assert time.monotonic() < deadline, "API did not become ready"
+        time.sleep(0.01)
+    return resp
+
+
+def test_livez_and_readyz(client):
+    warmed = threading.Event()
+
+    async def warm_up():
+        await asyncio.to_thread(warmed.wait, 5)
+        return {}
+
+    assert client.get("/livez").json() == {"status": "ok"}
+    assert client.get("/readyz").status_code == 503
+    with patch("api.warmup.warm_up", warm_up), client:
+        # The app serves while warming up, but only reports ready once it is done.
+        assert client.get("/livez").status_code == 200
+        assert client.get("/readyz").status_code == 503
+        warmed.set()
+        assert _wait_until_ready(client).json()["status"] == "ready"
+    assert client.get("/readyz").status_code == 503
+
+
+def test_failed_warm_up_still_becomes_ready(client):
+    with patch("api.warmup.warm_up", side_effect=RuntimeError("boom")), client:
+        _wait_until_ready(client)
+
+
+def test_shutdown_cancels_unfinished_warm_up(client):
+    cancelled = []
+
+    async def warm_up():
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    with patch("api.warmup.warm_up", warm_up), client:
+        assert client.get("/readyz").status_code == 503
+    assert cancelled == [True]
+    assert client.get("/readyz").status_code == 503
+
+
+def test_list_documents(client):
+    with patch("api.get_store_stats", return_value={"documents": 10, "sources": ["a.pdf"]}):
         resp = client.get("/documents")
         assert resp.status_code == 200
         assert resp.json()["count"] == 10
 
 
 def test_clear_documents(client):
-    with patch("api.clear_store"), patch("api.reset_chain"):
+    with patch("api.clear_store"):
         resp = client.delete("/documents")
         assert resp.status_code == 200
         assert resp.json()["status"] == "cleared"
@@ -67,6 +126,230 @@ def test_ask_requires_documents(client):
         assert resp.status_code == 400
 
 
+def test_ask_persists_messages(client):
+    result = {"answer": "An answer", "sources": [{"name": "doc.pdf", "type": "pdf"}]}
+    with (
+        patch("api.get_document_count", return_value=3),
+        patch("api.aask_question", new=AsyncMock(return_value=result)),
+        patch("api.evaluate_response", return_value={"chunks_used": 1}),
+    ):
+        resp = client.post("/ask", json={"question": "What?"})
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["answer"] == "An answer"
+        assert data["evaluation"] == {"chunks_used": 1}
+
+    messages = cs.get_messages(data["conversation_id"])
+    assert [m["role"] for m in messages] == ["user", "assistant"]
+    assert messages[1]["sources"] == result["sources"]
+
+
+def _parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_ask_stream_emits_sources_tokens_and_done(client):
+    sources = [{"name": "doc.pdf", "type": "pdf"}]
+
+    async def fake_stream(question, history, summary=None):
+        yield "Hello", sources, []
+        yield " world", sources, []
+
+    with (
+        patch("api.get_document_count", return_value=3),
+        patch("api.aask_question_stream", new=fake_stream),
+        patch("api.evaluate_response", return_value={"chunks_used": 1}),
+    ):
+        resp = client.post("/ask/stream", json={"question": "Hi?"})
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/event-stream")
+
+    events = _parse_sse(resp.text)
+    assert [name for name, _ in events] == ["sources", "token", "token", "done"]
+    assert events[0][1]["sources"] == sources
+    assert events[-1][1]["evaluation"] == {"chunks_used": 1}
+
+    messages = cs.get_messages(events[-1][1]["conversation_id"])
+    assert messages[-1]["content"] == "Hello world"
+    assert messages[-1]["sources"] == sources
+
+
+def _run_stream(stream, is_disconnected, on_first_event=None):
+    """Drive ask_stream directly, so events are seen as they are sent."""
+
+    async def run():
+        request = MagicMock()
+        request.is_disconnected = AsyncMock(side_effect=is_disconnected)
+        with (
+            patch("api.get_document_count", return_value=3),
+            patch("api.aask_question_stream", new=stream),
+            patch("api.evaluate_response", return_value={}),
+        ):
+            response = await ask_stream(QuestionRequest(question="Hi?"), request)
+            body = response.body_iterator
+            first = await asyncio.wait_for(anext(body), 1)
+            if on_first_event:
+                on_first_event()
+            return _parse_sse(first + "".join([chunk async for chunk in body]))
+
+    return asyncio.run(run())
+
+
+def test_ask_stream_sends_sources_before_first_token():
+    sources = [{"name": "doc.pdf", "type": "pdf"}]
+    prefill = threading.Event()
+
+    async def slow_prefill_stream(question, history, summary=None):
+        yield "", sources, []
+        await asyncio.to_thread(prefill.wait, 1)
+        yield "Hello", sources, []
+
+    events = _run_stream(slow_prefill_stream, lambda: False, on_first_event=lambda: prefill.set())
+
+    assert [name for name, _ in events] == ["sources", "token", "done"]
+    assert events[0][1]["sources"] == sources
+    assert events[1][1] == {"delta": "Hello"}
+
+
+def test_ask_stream_disconnect_cancels_generation():
+    closed = []
+
+    async def endless_stream(question, history, summary=None):
+        try:
+            yield "", [], []
+            while True:
+                yield "token ", [], []
+                await asyncio.sleep(0)
+        finally:
+            closed.append(True)
+
+    # Connected while sources are sent, gone before the first token.
+    checks = iter([False, True])
+    events = _run_stream(endless_stream, lambda: next(checks, True))
+
+    assert [name for name, _ in events] == ["sources"]
+    assert closed == [True]
+    [conversation] = cs.list_conversations()
+    assert [m["role"] for m in cs.get_messages(conversation["id"])] == ["user"]
+
+
+def test_ask_stream_reports_errors(client):
+    async def failing_stream(question, history, summary=None):
+        raise ConnectionError("No LLM available")
+        yield
+
+    with (
+        patch("api.get_document_count", return_value=3),
+        patch("api.aask_question_stream", new=failing_stream),
+    ):
+        resp = client.post("/ask/stream", json={"question": "Hi?"})
+
+    events = _parse_sse(resp.text)
+    assert events == [("error", {"detail": "No LLM available"})]
+
+
+def test_concurrent_identical_questions_share_one_answer():
+    calls = 0
+
+    async def slow_answer(question, history, summary):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"answer": "Shared", "sources": []}
+
+    async def run():
+        with (
+            patch("api.get_document_count", return_value=3),
+            patch("api.aask_question", new=slow_answer),
+            patch("api.evaluate_response", return_value={}),
+        ):
+            requests = [QuestionRequest(question="What is RAG?") for _ in range(3)]
+            return await asyncio.gather(*(ask(r, MagicMock()) for r in requests))
+
+    responses = asyncio.run(run())
+
+    assert calls == 1
+    assert {r.answer for r in responses} == {"Shared"}
+    assert len({r.conversation_id for r in responses}) == 3
+
+
+def test_ask_uses_summary_and_last_turn(client):
+    cid = cs.create_conversation("Long chat")
+    for i in range(6):
+        cs.add_message(cid, "user", f"Question {i}")
+        cs.add_message(cid, "assistant", f"Answer {i}")
+    cs.update_summary(cid, "Earlier questions covered topics 0-4.", 10)
+
+    mock_ask = AsyncMock(return_value={"answer": "A", "sources": []})
+    with (
+        patch("api.get_document_count", return_value=3),
+        patch("api.aask_question", new=mock_ask),
+        patch("api.evaluate_response", return_value={}),
+        patch("api.arefresh_summary", new_callable=AsyncMock) as mock_refresh,
+    ):
+        resp = client.post("/ask", json={"question": "Next?", "conversation_id": cid})
+        assert resp.status_code == 200
+
+    _, history, summary = mock_ask.call_args.args
+    assert [m["content"] for m in history] == ["Question 5", "Answer 5"]
+    assert summary == "Earlier questions covered topics 0-4."
+    mock_refresh.assert_awaited_once_with(cid)
+
+
+@pytest.mark.parametrize("write_behind", [False, True])
+@pytest.mark.parametrize("path", ["/ask", "/ask/stream"])
+def test_ask_unknown_conversation_is_404(client, path, write_behind):
+    mock_ask = AsyncMock()
+    with (
+        patch("api.get_document_count", return_value=3),
+        patch("api.aask_question", new=mock_ask),
+        patch.object(cs, "WRITE_BEHIND", write_behind),
+        patch.object(cs, "WRITE_BEHIND_INTERVAL_MS", 10_000),
+    ):
+        resp = client.post(path, json={"question": "Hi?", "conversation_id": 999})
+        assert resp.status_code == 404
+        assert cs.flush() == 0
+    mock_ask.assert_not_called()
+
+
+def test_ask_conversation_deleted_mid_turn_is_404(client):
+    cid = cs.create_conversation("Gone")
+    with (
+        patch("api.get_document_count", return_value=3),
+        patch("api.cs.get_summary", side_effect=lambda c: cs.delete_conversation(c)),
+    ):
+        resp = client.post("/ask", json={"question": "Hi?", "conversation_id": cid})
+    assert resp.status_code == 404
+
+
+def test_ask_batch_streams_ndjson(client):
+    async def fake_ask_questions(questions):
+        for i, question in reversed(list(enumerate(questions))):
+            yield {"index": i, "question": question, "answer": f"A{i}"}
+
+    with (
+        patch("api.get_document_count", return_value=3),
+        patch("api.ask_questions", new=fake_ask_questions),
+    ):
+        resp = client.post("/ask/batch", json={"questions": ["Q0", "Q1"]})
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+
+    results = [json.loads(line) for line in resp.text.splitlines()]
+    assert [r["index"] for r in results] == [1, 0]
+    assert results[1]["answer"] == "A0"
+    assert cs.list_conversations() == []
+
+
+def test_ask_batch_rejects_empty(client):
+    resp = client.post("/ask/batch", json={"questions": []})
+    assert resp.status_code == 422
+
+
 def test_list_conversations(client):
     cs.create_conversation("Test")
     resp = client.get("/conversations")
@@ -76,6 +359,19 @@ def test_list_conversations(client):
     assert data[0]["title"] == "Test"
 
 
+def test_list_conversations_paginates(client):
+    for i in range(3):
+        cs.create_conversation(f"Chat {i}")
+
+    resp = client.get("/conversations", params={"limit": 2})
+    assert [c["title"] for c in resp.json()] == ["Chat 2", "Chat 1"]
+    cursor = resp.headers["X-Next-Cursor"]
+
+    resp = client.get("/conversations", params={"limit": 2, "cursor": cursor})
+    assert [c["title"] for c in resp.json()] == ["Chat 0"]
+    assert "X-Next-Cursor" not in resp.headers
+
+
 def test_delete_conversation(client):
     cid = cs.create_conversation("To Delete")
     resp = client.delete(f"/conversations/{cid}")
@@ -99,10 +395,25 @@ def test_get_messages(client):
     assert len(resp.json()["messages"]) == 1
 
 
+def test_get_messages_paginates(client):
+    cid = cs.create_conversation("Chat")
+    for i in range(3):
+        cs.add_message(cid, "user", f"Q{i}", sources=None)
+
+    page = client.get(f"/conversations/{cid}/messages", params={"limit": 2}).json()
+    assert [m["content"] for m in page["messages"]] == ["Q0", "Q1"]
+    assert page["next_cursor"] == page["messages"][-1]["id"]
+
+    rest = client.get(
+        f"/conversations/{cid}/messages", params={"limit": 2, "after": page["next_cursor"]}
+    ).json()
+    assert [m["content"] for m in rest["messages"]] == ["Q2"]
+    assert rest["next_cursor"] is None
+
+
 def test_reconnect_llm(client):
     with (
         patch("api.reset_llm"),
-        patch("api.reset_chain"),
         patch("api.get_llm", return_value=(MagicMock(), "ollama")),
     ):
         resp = client.post("/llm/reconnect")
@@ -121,3 +432,154 @@ def test_upload_unsupported_file(client):
 def test_load_url_invalid(client):
     resp = client.post("/documents/url", json={"url": "not-a-url"})
     assert resp.status_code == 422
+
+
+def test_search_conversations(client):
+    cid = cs.create_conversation("Billing")
+    for i in range(3):
+        cs.add_message(cid, "user", f"Refund question {i}")
+    cs.add_message(cid, "assistant", "Unrelated answer")
+
+    page = client.get("/conversations/search", params={"q": "refund", "limit": 2}).json()
+    assert len(page["results"]) == 2
+    assert page["results"][0]["conversation_id"] == cid
+    assert "[Refund]" in page["results"][0]["snippet"]
+    assert page["next_offset"] == 2
+    assert page["truncated"] is False
+
+    rest = client.get(
+        "/conversations/search", params={"q": "refund", "limit": 2, "offset": 2}
+    ).json()
+    assert len(rest["results"]) == 1
+    assert rest["next_offset"] is None
+
+    assert client.get("/conversations/search").status_code == 422
+
+
+def test_search_conversations_reports_truncation(client):
+    cid = cs.create_conversation("Billing")
+    for i in range(3):
+        cs.add_message(cid, "user", f"Refund question {i}")
+
+    with patch.object(cs, "SEARCH_CANDIDATES", 2):
+        page = client.get("/conversations/search", params={"q": "refund", "limit": 1}).json()
+        assert page["truncated"] is True
+        assert page["next_offset"] == 1
+        last = client.get(
+            "/conversations/search", params={"q": "refund", "limit": 1, "offset": 1}
+        ).json()
+    assert len(last["results"]) == 1
+    assert last["next_offset"] is None
+
+
+def test_upload_runs_as_background_job(client):
+    with (
+        patch("api.load_txt", return_value=[Document(page_content="hello world")]) as load,
+        patch("src.ingest_jobs.add_documents", side_effect=len),
+    ):
+        resp = client.post(
+            "/documents/upload",
+            files={"file": ("notes.txt", BytesIO(b"hello world"), "text/plain")},
+        )
+        assert resp.status_code == 202
+        job_id = resp.json()["job_id"]
+
+        for _ in range(100):
+            job = client.get(f"/jobs/{job_id}").json()
+            if job["status"] in ("done", "failed"):
+                break
+            time.sleep(0.01)
+
+    assert job["status"] == "done"
+    assert job["chunks_done"] == job["chunks_total"] == 1
+    assert load.call_args.args[0].name == "notes.txt"
+
+
+def test_unknown_job(client):
+    assert client.get("/jobs/missing").status_code == 404
+
+
+def test_metrics_endpoint(client):
+    cs.create_conversation("Chat")
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert "# TYPE rag_ask_seconds histogram" in resp.text
+    assert 'conversation_store_seconds_count{operation="create_conversation"}' in resp.text
+
+
+def test_ask_traces_each_stage(client, tmp_path):
+    mock_ask = AsyncMock(return_value={"answer": "A", "sources": [], "k": 2, "prompt_tokens": 90})
+    trace_file = tmp_path / "spans.jsonl"
+    tracing._exporter = None
+    with (
+        patch("api.get_document_count", return_value=3),
+        patch("api.aask_question", new=mock_ask),
+        patch("api.evaluate_response", return_value={}),
+        patch("api.arefresh_summary"),
+        patch.object(tracing, "TRACE_SAMPLE_RATE", 1.0),
+        patch.object(tracing, "TRACE_FILE", trace_file),
+    ):
+        assert client.post("/ask", json={"question": "Hi?"}).status_code == 200
+    tracing._exporter = None
+
+    [line] = trace_file.read_text().splitlines()
+    spans = json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    names = [span["name"] for span in spans]
+    assert names == ["history_load", "answer", "persistence", "evaluation", "POST /ask"]
+    answer = spans[1]["attributes"]
+    assert {"key": "k", "value": {"intValue": "2"}} in answer
+    assert {"key": "cache_hit", "value": {"boolValue": False}} in answer
+
+
+def test_ask_stream_traces_each_stage(client, tmp_path):
+    async def fake_stream(question, history, summary=None):
+        start = time.time_ns()
+        yield "Hello", [], []
+        tracing.record_span("llm_stream", start, chunks=1)
+
+    trace_file = tmp_path / "spans.jsonl"
+    tracing._exporter = None
+    with (
+        patch("api.get_document_count", return_value=3),
+        patch("api.aask_question_stream", new=fake_stream),
+        patch("api.evaluate_response", return_value={}),
+        patch("api.arefresh_summary"),
+        patch.object(tracing, "TRACE_SAMPLE_RATE", 1.0),
+        patch.object(tracing, "TRACE_FILE", trace_file),
+    ):
+        resp = client.post("/ask/stream", json={"question": "Hi?"})
+        assert [name for name, _ in _parse_sse(resp.text)][-1] == "done"
+    tracing._exporter = None
+
+    [line] = trace_file.read_text().splitlines()
+    spans = json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    names = [span["name"] for span in spans]
+    assert names == [
+        "history_load",
+        "llm_stream",
+        "answer",
+        "persistence",
+        "evaluation",
+        "POST /ask/stream",
+    ]
+
+
+def test_profiled_ask_can_be_listed_and_downloaded(client, tmp_path):
+    mock_ask = AsyncMock(return_value={"answer": "A", "sources": []})
+    with (
+        patch("api.get_document_count", return_value=3),
+        patch("api.aask_question", new=mock_ask),
+        patch("api.evaluate_response", return_value={}),
+        patch("api.arefresh_summary"),
+        patch.object(profiling, "PROFILING_ENABLED", True),
+        patch.object(profiling, "PROFILE_DIR", tmp_path / "profiles"),
+    ):
+        resp = client.post("/ask", json={"question": "Hi?"}, headers={"X-Profile": "1"})
+        assert resp.status_code == 200
+
+        [profile] = client.get("/admin/profiles").json()
+        assert profile["kind"] == "folded"
+        download = client.get(f"/admin/profiles/{profile['name']}")
+        assert download.status_code == 200
+        assert client.get("/admin/profiles/missing.prof").status_code == 404
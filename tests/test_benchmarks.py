@@ -0,0 +1,102 @@
+import json
+import math
+from unittest.mock import patch
+
+import pytest
+
+from benchmarks import loadgen, run
+from benchmarks.fakes import HashEmbeddings, synthetic_documents
+from src import retention
+
+
+def test_hash_embeddings_are_deterministic_unit_vectors():
+    embeddings = HashEmbeddings()
+    first = embeddings.embed_query("refund policy for invoices")
+    assert first == HashEmbeddings().embed_query("refund policy for invoices")
+    assert math.isclose(math.sqrt(sum(x * x for x in first)), 1.0)
+    related, unrelated = embeddings.embed_documents(["invoice refund policy", "cluster deploy"])
+    assert sum(a * b for a, b in zip(first, related, strict=True)) > sum(
+        a * b for a, b in zip(first, unrelated, strict=True)
+    )
+
+
+def test_synthetic_documents_are_reproducible():
+    assert [d.page_content for d in synthetic_documents(2, words=50)] == [
+        d.page_content for d in synthetic_documents(2, words=50)
+    ]
+
+
+def test_compare_flags_only_regressions_beyond_threshold():
+    baseline = {"results": {"search@100": {"median_ms": 10.0}, "ask@100": {"median_ms": 5.0}}}
+    current = {
+        "results": {
+            "search@100": {"median_ms": 14.0},
+            "ask@100": {"median_ms": 5.5},
+            "new@100": {"median_ms": 1.0},
+        }
+    }
+    regressions = run.compare(current, baseline, threshold=0.25)
+    assert [r["scenario"] for r in regressions] == ["search@100"]
+    assert regressions[0]["ratio"] == 1.4
+
+
+def test_suite_runs_offline(tmp_path):
+    output = tmp_path / "results.json"
+    argv = ["--sizes", "30", "--queries", "3", "--import-repeat", "0"]
+    assert run.main([*argv, "--output", str(output)]) == 0
+    assert run.main([*argv, "--compare", str(output), "--threshold", "100"]) == 0
+
+
+def test_importing_the_api_defers_heavy_dependencies():
+    result = run.measure_import("api", times=1)
+    assert result["n"] == 1
+    assert result["heavy_modules"] == []
+
+
+def test_parse_mix_normalizes_weights():
+    assert loadgen.parse_mix("ask=3,upload=1") == {"ask": 0.75, "upload": 0.25}
+    with pytest.raises(ValueError):
+        loadgen.parse_mix("ask=1,delete=1")
+
+
+def test_load_questions_replays_text_json_lines_and_archives(tmp_path):
+    log = tmp_path / "queries.txt"
+    log.write_text('What is RAG?\n\n{"question": "How are chunks sized?"}\n')
+    assert loadgen.load_questions(log) == ["What is RAG?", "How are chunks sized?"]
+
+    with patch.object(retention, "ARCHIVE_DIR", tmp_path / "archive"):
+        segment = retention.write_segment(
+            [
+                {
+                    "id": 1,
+                    "messages": [
+                        {"role": "user", "content": "Where is the refund policy?"},
+                        {"role": "assistant", "content": "In the billing guide."},
+                    ],
+                }
+            ]
+        )
+    assert loadgen.load_questions(segment) == ["Where is the refund policy?"]
+
+
+def test_summarize_reports_percentiles_errors_and_ttft():
+    samples = [loadgen.Sample("ask", 0, i / 1000, True) for i in range(1, 101)]
+    samples.append(loadgen.Sample("stream", 0, 0.5, True, ttft=0.05))
+    samples.append(loadgen.Sample("stream", 0, 0.1, False, error="HTTP 500"))
+    report = loadgen.summarize(samples, elapsed=2.0)
+    assert report["ask"]["p50_ms"] == 50.0
+    assert report["ask"]["p99_ms"] == 99.0
+    assert report["ask"]["throughput_rps"] == 50.0
+    assert report["stream"]["error_rate"] == 0.5
+    assert report["stream"]["ttft"]["p50_ms"] == 50.0
+    assert report["all"]["requests"] == 102
+
+
+def test_loadgen_drives_an_in_process_api(tmp_path):
+    output = tmp_path / "load.json"
+    argv = ["--requests", "8", "--concurrency", "2", "--corpus-documents", "5"]
+    argv += ["--mix", "ask=1,stream=1,upload=1", "--output", str(output)]
+    assert loadgen.main(argv) == 0
+    results = json.loads(output.read_text())["results"]
+    assert results["all"]["requests"] == 8
+    assert results["all"]["errors"] == 0
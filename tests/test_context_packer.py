@@ -0,0 +1,50 @@
+from langchain_core.documents import Document
+
+from src.context_packer import estimate_tokens, pack_documents
+
+
+def test_estimate_tokens():
+    """Test the token estimate scales with text length."""
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+
+
+def test_pack_documents_keeps_docs_within_budget():
+    """Test that documents fitting the budget are kept unchanged."""
+    docs = [Document(page_content="a" * 40), Document(page_content="b" * 40)]
+
+    packed = pack_documents(docs, budget=20)
+
+    assert packed == docs
+
+
+def test_pack_documents_trims_to_sentence_boundary():
+    """Test that an oversized document is trimmed to whole sentences."""
+    text = "First sentence here. Second sentence here. Third sentence here."
+    docs = [Document(page_content=text, metadata={"filename": "a.txt"})]
+
+    packed = pack_documents(docs, budget=estimate_tokens("First sentence here. Second"))
+
+    assert len(packed) == 1
+    assert packed[0].page_content == "First sentence here."
+    assert packed[0].metadata["truncated"] is True
+    assert packed[0].metadata["filename"] == "a.txt"
+    assert "truncated" not in docs[0].metadata
+
+
+def test_pack_documents_prefers_highest_score():
+    """Test that higher-scoring documents are packed first."""
+    low = Document(page_content="x" * 40, metadata={"score": 0.2})
+    high = Document(page_content="y" * 40, metadata={"score": 0.9})
+
+    packed = pack_documents([low, high], budget=10)
+
+    assert packed == [high]
+
+
+def test_pack_documents_empty_budget():
+    """Test that no documents are packed without budget."""
+    docs = [Document(page_content="Some text.")]
+
+    assert pack_documents(docs, budget=0) == []
@@ -1,4 +1,8 @@
+import sqlite3
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from unittest.mock import patch
 
@@ -52,7 +56,9 @@ def test_delete_conversation(tmp_dir):
     with patch.object(cs, "DB_PATH", db_path):
         cid = cs.create_conversation("To Delete")
         cs.add_message(cid, "user", "message")
+        assert cs.conversation_exists(cid)
         cs.delete_conversation(cid)
+        assert not cs.conversation_exists(cid)
 
         conversations = cs.list_conversations()
         assert len(conversations) == 0
@@ -97,3 +103,397 @@ def test_multiple_conversations_ordered_by_recent(tmp_dir):
         assert conversations[0]["id"] == cid1  # Most recently updated
         assert conversations[1]["id"] == cid2
     cs.close()
+
+
+def test_get_recent_messages(tmp_dir):
+    db_path = _reset_store(tmp_dir)
+    with patch.object(cs, "DB_PATH", db_path):
+        cid = cs.create_conversation()
+        for i in range(5):
+            cs.add_message(cid, "user", f"Q{i}")
+
+        recent = cs.get_recent_messages(cid, 2)
+        assert [m["content"] for m in recent] == ["Q3", "Q4"]
+    cs.close()
+
+
+def test_summary_tracks_folded_messages(tmp_dir):
+    db_path = _reset_store(tmp_dir)
+    with patch.object(cs, "DB_PATH", db_path):
+        cid = cs.create_conversation()
+        first = cs.add_message(cid, "user", "Q1")
+        cs.add_message(cid, "assistant", "A1")
+        assert cs.get_summary(cid) is None
+        assert len(cs.get_unsummarized_messages(cid)) == 2
+
+        cs.update_summary(cid, "User asked Q1.", first)
+        assert cs.get_summary(cid) == "User asked Q1."
+        assert [m["content"] for m in cs.get_unsummarized_messages(cid)] == ["A1"]
+
+        # A stale update never rolls the summary back.
+        cs.update_summary(cid, "Older summary.", first - 1)
+        assert cs.get_summary(cid) == "User asked Q1."
+    cs.close()
+
+
+def test_concurrent_writers_stress(tmp_dir):
+    """64 concurrent writers (plus readers) complete without errors or lost writes."""
+    db_path = _reset_store(tmp_dir)
+    writers, messages_each = 64, 20
+    with patch.object(cs, "DB_PATH", db_path):
+        cids = [cs.create_conversation(f"Chat {i}") for i in range(writers)]
+        errors = []
+        stop = threading.Event()
+
+        def write(cid):
+            try:
+                for i in range(messages_each):
+                    cs.add_message(cid, "user", f"message {i}")
+            except Exception as e:
+                errors.append(e)
+
+        def read():
+            try:
+                while not stop.is_set():
+                    cs.list_conversations()
+                    cs.get_recent_messages(cids[0], 3)
+            except Exception as e:
+                errors.append(e)
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=writers) as pool:
+            list(pool.map(write, cids))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        for reader in readers:
+            reader.join()
+
+        total = writers * messages_each
+        print(
+            f"\n{total} writes from {writers} threads in {elapsed:.2f}s ({total / elapsed:.0f}/s)"
+        )
+        assert errors == []
+        counts = {c["id"]: c["message_count"] for c in cs.list_conversations()}
+        assert all(counts[cid] == messages_each for cid in cids)
+    cs.close()
+
+
+def test_failed_write_rolls_back(tmp_dir):
+    db_path = _reset_store(tmp_dir)
+    with patch.object(cs, "DB_PATH", db_path):
+        cid = cs.create_conversation()
+        with pytest.raises(sqlite3.IntegrityError):
+            cs.add_message(cid, "robot", "invalid role")
+        cs.add_message(cid, "user", "valid")
+
+        assert [m["content"] for m in cs.get_messages(cid)] == ["valid"]
+    cs.close()
+
+
+def test_recent_messages_without_sources(tmp_dir):
+    db_path = _reset_store(tmp_dir)
+    with patch.object(cs, "DB_PATH", db_path):
+        cid = cs.create_conversation()
+        cs.add_message(cid, "assistant", "A", sources=[{"name": "doc.pdf"}])
+
+        assert "sources" in cs.get_recent_messages(cid, 1)[0]
+        assert "sources" not in cs.get_recent_messages(cid, 1, include_sources=False)[0]
+    cs.close()
+
+
+def test_list_messages_keyset_pagination(tmp_dir):
+    db_path = _reset_store(tmp_dir)
+    with patch.object(cs, "DB_PATH", db_path):
+        cid = cs.create_conversation()
+        other = cs.create_conversation()
+        for i in range(5):
+            cs.add_message(cid, "user", f"Q{i}")
+            cs.add_message(other, "user", f"other {i}")
+
+        first = cs.list_messages(cid, limit=2)
+        second = cs.list_messages(cid, after_id=first[-1]["id"], limit=2)
+        last = cs.list_messages(cid, after_id=second[-1]["id"], limit=2)
+
+        assert [m["content"] for m in first + second + last] == [f"Q{i}" for i in range(5)]
+        assert len(last) == 1
+    cs.close()
+
+
+def test_list_conversations_keyset_pagination(tmp_dir):
+    db_path = _reset_store(tmp_dir)
+    with patch.object(cs, "DB_PATH", db_path):
+        cids = [cs.create_conversation(f"Chat {i}") for i in range(5)]
+        cs.add_message(cids[0], "user", "bump")
+
+        first = cs.list_conversations(limit=2)
+        second = cs.list_conversations(limit=2, before=first[-1]["updated_seq"])
+        last = cs.list_conversations(limit=2, before=second[-1]["updated_seq"])
+
+        order = [c["id"] for c in first + second + last]
+        assert order == [cids[0], cids[4], cids[3], cids[2], cids[1]]
+        assert first[0]["message_count"] == 1
+        assert first[0]["last_message_at"] is not None
+    cs.close()
+
+
+def test_counters_backfilled_for_existing_databases(tmp_dir):
+    db_path = _reset_store(tmp_dir)
+    with sqlite3.connect(db_path) as legacy:
+        legacy.executescript(
+            """
+            CREATE TABLE conversations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                created_at TEXT NOT NULL DEFAULT (datetime('now')),
+                updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+            );
+            CREATE TABLE messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                sources TEXT,
+                created_at TEXT NOT NULL DEFAULT (datetime('now'))
+            );
+            INSERT INTO conversations (title, updated_at) VALUES ('Old', '2024-01-01 00:00:00');
+            INSERT INTO conversations (title, updated_at) VALUES ('New', '2025-01-01 00:00:00');
+            INSERT INTO messages (conversation_id, role, content) VALUES (1, 'user', 'Q1');
+            INSERT INTO messages (conversation_id, role, content) VALUES (1, 'assistant', 'A1');
+            """
+        )
+    legacy.close()
+
+    with patch.object(cs, "DB_PATH", db_path):
+        conversations = cs.list_conversations()
+        assert [c["title"] for c in conversations] == ["New", "Old"]
+        assert conversations[1]["message_count"] == 2
+
+        cs.add_message(1, "user", "Q2")
+        assert cs.list_conversations()[0]["title"] == "Old"
+    cs.close()
+
+
+def test_write_behind_batches_commits(tmp_dir):
+    db_path = _reset_store(tmp_dir)
+    with patch.object(cs, "DB_PATH", db_path):
+        cid = cs.create_conversation("Chat")
+
+        start = cs._commit_count
+        for i in range(200):
+            cs.add_message(cid, "user", f"sync {i}")
+        sync_commits = cs._commit_count - start
+
+        with (
+            patch.object(cs, "WRITE_BEHIND", True),
+            patch.object(cs, "WRITE_BEHIND_INTERVAL_MS", 10_000),
+        ):
+            start = cs._commit_count
+            for i in range(200):
+                assert cs.add_message(cid, "user", f"queued {i}") is None
+            assert cs.flush() == 200
+            batched_commits = cs._commit_count - start
+
+        assert sync_commits == 200
+        assert batched_commits == 1
+        assert cs.list_conversations()[0]["message_count"] == 400
+    cs.close()
+
+
+def test_write_behind_reads_and_writes_see_queued_messages(tmp_dir):
+    db_path = _reset_store(tmp_dir)
+    with (
+        patch.object(cs, "DB_PATH", db_path),
+        patch.object(cs, "WRITE_BEHIND", True),
+        patch.object(cs, "WRITE_BEHIND_INTERVAL_MS", 10_000),
+    ):
+        cid = cs.create_conversation("Chat")
+        cs.add_message(cid, "user", "Hello", sources=[{"name": "a.pdf"}])
+        cs.add_message(cid, "assistant", "Hi")
+        messages = cs.get_messages(cid)
+        assert [m["content"] for m in messages] == ["Hello", "Hi"]
+        assert messages[0]["sources"] == [{"name": "a.pdf"}]
+
+        cs.add_message(cid, "user", "Bye")
+        cs.delete_conversation(cid)
+        assert cs.get_messages(cid) == []
+
+        with pytest.raises(ValueError):
+            cs.add_message(cid, "system", "nope")
+    cs.close()
+
+
+def test_write_behind_reads_flush_only_their_conversation(tmp_dir):
+    db_path = _reset_store(tmp_dir)
+    with (
+        patch.object(cs, "DB_PATH", db_path),
+        patch.object(cs, "WRITE_BEHIND", True),
+        patch.object(cs, "WRITE_BEHIND_INTERVAL_MS", 10_000),
+    ):
+        first = cs.create_conversation("First")
+        second = cs.create_conversation("Second")
+        cs.add_message(first, "user", "Q1")
+        cs.add_message(second, "user", "Q2")
+        cs.add_message(second, "assistant", "A2")
+
+        start = cs._commit_count
+        assert [m["content"] for m in cs.get_recent_messages(first, 2)] == ["Q1"]
+        assert cs._commit_count - start == 1
+        assert [m[2] for m in cs._pending] == ["Q2", "A2"]
+
+        # Reads with nothing queued for their conversation do not touch the writer.
+        cs.get_recent_messages(first, 2)
+        cs.list_conversations()
+        cs.get_unsummarized_messages(first)
+        assert cs._commit_count - start == 1
+
+        cs.delete_conversation(second)
+        assert cs._pending == []
+        assert not cs._unflushed
+        assert cs.flush() == 0
+    cs.close()
+
+
+def test_write_behind_flushes_on_close(tmp_dir):
+    db_path = _reset_store(tmp_dir)
+    with (
+        patch.object(cs, "DB_PATH", db_path),
+        patch.object(cs, "WRITE_BEHIND", True),
+        patch.object(cs, "WRITE_BEHIND_INTERVAL_MS", 10_000),
+    ):
+        cid = cs.create_conversation("Chat")
+        cs.add_message(cid, "user", "Hello")
+        cs.close()
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT content FROM messages").fetchall() == [("Hello",)]
+
+
+def test_search_messages_ranked_with_snippets(tmp_dir):
+    db_path = _reset_store(tmp_dir)
+    with patch.object(cs, "DB_PATH", db_path):
+        first = cs.create_conversation("Billing")
+        second = cs.create_conversation("Setup")
+        cs.add_message(first, "user", "How do refunds work for annual plans?")
+        cs.add_message(first, "assistant", "Refunds are prorated. Refunds take five days.")
+        cs.add_message(second, "user", "How do I install the agent?")
+
+        results = cs.search_messages("refund")
+        assert [r["conversation_id"] for r in results] == [first, first]
+        assert sorted(r["snippet"].lower().count("[refunds]") for r in results) == [1, 2]
+        assert results[0]["title"] == "Billing"
+        assert results[0]["score"] >= results[1]["score"]
+
+        assert len(cs.search_messages("refund", limit=1, offset=1)) == 1
+        assert cs.search_messages('install "agent') == cs.search_messages("install agent")
+        assert cs.search_messages("   ") == []
+        assert not cs.search_truncated("refund")
+        with patch.object(cs, "SEARCH_CANDIDATES", 1):
+            assert len(cs.search_messages("refund")) == 1
+            assert cs.search_truncated("refund")
+            assert not cs.search_truncated("install")
+
+        cs.delete_conversation(first)
+        assert cs.search_messages("refunds") == []
+    cs.close()
+
+
+def test_search_uses_fts_index(tmp_dir):
+    db_path = _reset_store(tmp_dir)
+    with patch.object(cs, "DB_PATH", db_path):
+        conn = cs._get_read_conn()
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT m.id FROM (SELECT rowid AS id FROM messages_fts "
+            "WHERE messages_fts MATCH 'x' ORDER BY rowid DESC LIMIT 1000) AS hits "
+            "JOIN messages m ON m.id = hits.id JOIN conversations c ON c.id = m.conversation_id"
+        ).fetchall()
+        details = [row["detail"] for row in plan]
+        assert any("VIRTUAL TABLE INDEX" in d for d in details)
+        assert not any(d.split()[:2] in (["SCAN", "m"], ["SCAN", "c"]) for d in details)
+    cs.close()
+
+
+def test_search_index_built_for_existing_databases(tmp_dir):
+    db_path = _reset_store(tmp_dir)
+    with patch.object(cs, "DB_PATH", db_path):
+        cid = cs.create_conversation("Chat")
+        cs.add_message(cid, "user", "Kubernetes deployment question")
+        cs.close()
+
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("DROP TABLE messages_fts")
+            for trigger in ("insert", "delete", "update"):
+                conn.execute(f"DROP TRIGGER messages_fts_{trigger}")
+
+        assert [r["conversation_id"] for r in cs.search_messages("kubernetes")] == [cid]
+    cs.close()
+
+
+def test_sources_deduplicated_and_hydrated(tmp_dir):
+    db_path = _reset_store(tmp_dir)
+    sources = [
+        {"content": "Refunds are prorated.", "type": "pdf", "name": "policy.pdf", "page": 2},
+        {"content": "Plans renew yearly.", "type": "pdf", "name": "policy.pdf", "score": 0.8},
+    ]
+    with patch.object(cs, "DB_PATH", db_path):
+        cid = cs.create_conversation("Chat")
+        for _ in range(3):
+            cs.add_message(cid, "assistant", "Answer", sources=sources)
+
+        messages = cs.get_messages(cid)
+        assert all(m["sources"] == sources for m in messages)
+        assert cs.list_messages(cid, include_sources=False)[0].get("sources") is None
+
+        conn = cs._get_read_conn()
+        assert conn.execute("SELECT COUNT(*) FROM source_previews").fetchone()[0] == 2
+        stored = conn.execute("SELECT sources FROM messages LIMIT 1").fetchone()[0]
+        assert "Refunds" not in stored
+    cs.close()
+
+
+def test_large_payloads_compressed(tmp_dir):
+    db_path = _reset_store(tmp_dir)
+    sources = [
+        {"content": f"Chunk {i} " + "lorem ipsum " * 60, "type": "txt", "name": f"doc{i}.txt"}
+        for i in range(6)
+    ]
+    with patch.object(cs, "DB_PATH", db_path):
+        cid = cs.create_conversation("Chat")
+        cs.add_message(cid, "assistant", "Answer", sources=sources)
+        assert cs.get_messages(cid)[0]["sources"] == sources
+
+        conn = cs._get_read_conn()
+        types = {row[0] for row in conn.execute("SELECT typeof(content) FROM source_previews")}
+        assert types == {"blob"}
+    cs.close()
+
+
+def test_legacy_inline_sources_still_read(tmp_dir):
+    db_path = _reset_store(tmp_dir)
+    with patch.object(cs, "DB_PATH", db_path):
+        cid = cs.create_conversation("Chat")
+        cs.close()
+        with sqlite3.connect(db_path) as conn:
+            conn.execute(
+                "INSERT INTO messages (conversation_id, role, content, sources) VALUES (?, ?, ?, ?)",
+                (cid, "assistant", "Old", '[{"content": "inline", "name": "a.pdf"}]'),
+            )
+        assert cs.get_messages(cid)[0]["sources"] == [{"content": "inline", "name": "a.pdf"}]
+    cs.close()
+
+
+def test_write_behind_drops_messages_for_missing_conversations(tmp_dir):
+    db_path = _reset_store(tmp_dir)
+    with (
+        patch.object(cs, "DB_PATH", db_path),
+        patch.object(cs, "WRITE_BEHIND", True),
+        patch.object(cs, "WRITE_BEHIND_INTERVAL_MS", 10_000),
+    ):
+        cid = cs.create_conversation("Chat")
+        cs.add_message(cid, "user", "kept")
+        cs.add_message(cid + 1, "user", "orphan")
+        assert cs.flush() == 1
+        assert [m["content"] for m in cs.get_messages(cid)] == ["kept"]
+    cs.close()
@@ -41,7 +41,7 @@ def test_load_pdf(tmp_path, monkeypatch):
         )
     ]
 
-    with patch("src.document_loader.PyPDFLoader") as mock_loader:
+    with patch("langchain_community.document_loaders.PyPDFLoader") as mock_loader:
         mock_loader.return_value.load.return_value = mock_docs
         fake_file = FakeUploadedFile("test.pdf", b"%PDF-1.4 fake content")
 
@@ -61,7 +61,7 @@ def test_load_web():
         )
     ]
 
-    with patch("src.document_loader.WebBaseLoader") as mock_loader:
+    with patch("langchain_community.document_loaders.WebBaseLoader") as mock_loader:
         mock_loader.return_value.load.return_value = mock_docs
 
         docs = load_web("https://example.com")
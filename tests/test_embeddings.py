@@ -7,7 +7,7 @@ def test_get_embeddings_returns_instance():
     """Test that get_embeddings returns an embeddings instance."""
     embeddings_module._embeddings = None
 
-    with patch("src.embeddings.HuggingFaceEmbeddings") as mock_hf:
+    with patch("langchain_huggingface.HuggingFaceEmbeddings") as mock_hf:
         mock_instance = MagicMock()
         mock_hf.return_value = mock_instance
 
@@ -21,7 +21,7 @@ def test_get_embeddings_singleton():
     """Test that get_embeddings returns the same instance on repeated calls."""
     embeddings_module._embeddings = None
 
-    with patch("src.embeddings.HuggingFaceEmbeddings") as mock_hf:
+    with patch("langchain_huggingface.HuggingFaceEmbeddings") as mock_hf:
         mock_instance = MagicMock()
         mock_hf.return_value = mock_instance
 
@@ -37,7 +37,7 @@ def test_get_embeddings_uses_config():
     embeddings_module._embeddings = None
 
     with (
-        patch("src.embeddings.HuggingFaceEmbeddings") as mock_hf,
+        patch("langchain_huggingface.HuggingFaceEmbeddings") as mock_hf,
         patch("src.embeddings.EMBEDDING_MODEL", "test-model"),
     ):
         embeddings_module.get_embeddings()
@@ -0,0 +1,44 @@
+from unittest.mock import MagicMock, patch
+
+from langchain_core.documents import Document
+
+from src.evaluation import calculate_retrieval_relevance, evaluate_response
+
+
+def test_relevance_uses_retriever_scores():
+    """Test that attached retrieval scores are used without embedding calls."""
+    docs = [
+        Document(page_content="a", metadata={"score": 0.9}),
+        Document(page_content="b", metadata={"score": 0.5}),
+    ]
+
+    with patch("src.evaluation.get_embeddings") as mock_get_embeddings:
+        relevance = calculate_retrieval_relevance("query", docs)
+
+    mock_get_embeddings.assert_not_called()
+    assert relevance == {"scores": [0.9, 0.5], "avg_score": 0.7}
+
+
+def test_relevance_falls_back_to_embeddings():
+    """Test that unscored documents are re-embedded."""
+    mock_embeddings = MagicMock()
+    mock_embeddings.embed_query.return_value = [1.0, 0.0]
+    docs = [Document(page_content="a", metadata={})]
+
+    with patch("src.evaluation.get_embeddings", return_value=mock_embeddings):
+        relevance = calculate_retrieval_relevance("query", docs)
+
+    assert relevance["scores"] == [1.0]
+    assert mock_embeddings.embed_query.call_count == 2
+
+
+def test_evaluate_response_records_k_and_prompt_tokens():
+    """Test that k is read from context metadata and prompt tokens are recorded."""
+    docs = [Document(page_content="a", metadata={"score": 0.8, "retrieved_k": 3})]
+
+    evaluation = evaluate_response("q", "an answer", docs, [{}], 1.234, prompt_tokens=120)
+
+    assert evaluation["k"] == 3
+    assert evaluation["prompt_tokens"] == 120
+    assert evaluation["response_time"] == 1.23
+    assert evaluation["chunks_used"] == 1
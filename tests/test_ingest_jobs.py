@@ -0,0 +1,105 @@
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from langchain_core.documents import Document
+
+from src import ingest_jobs
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool():
+    ingest_jobs.shutdown()
+    ingest_jobs._jobs.clear()
+    yield
+    ingest_jobs.shutdown()
+
+
+def _wait(job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = ingest_jobs.get_job(job_id)
+        if job.finished_at is not None:
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_job_reports_progress_and_chunk_counts():
+    docs = [Document(page_content="word " * 2000, metadata={"filename": "a.txt"})]
+    with (
+        patch("src.ingest_jobs.add_documents", side_effect=len) as add,
+        patch.object(ingest_jobs, "INGEST_BATCH_SIZE", 4),
+    ):
+        job = ingest_jobs.submit("a.txt", lambda: docs)
+        job = _wait(job.id)
+
+    assert job.status == "done"
+    assert job.stage == "done"
+    assert job.progress == 1.0
+    assert job.documents == 1
+    assert job.chunks_done == job.chunks_total > 4
+    assert all(len(call.args[0]) <= 4 for call in add.call_args_list)
+
+
+def test_failed_job_records_error():
+    def load():
+        raise ValueError("No content found")
+
+    job = _wait(ingest_jobs.submit("bad.pdf", load).id)
+    assert job.status == "failed"
+    assert job.stage == "loading"
+    assert job.error == "No content found"
+
+
+def test_concurrency_is_bounded():
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def load():
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        return []
+
+    with patch.object(ingest_jobs, "INGEST_MAX_CONCURRENCY", 2):
+        jobs = [ingest_jobs.submit(f"doc{i}", load) for i in range(6)]
+        assert ingest_jobs.active_jobs() > 0
+        for job in jobs:
+            _wait(job.id)
+
+    assert peak == 2
+    assert ingest_jobs.active_jobs() == 0
+
+
+def test_finished_jobs_are_forgotten():
+    with patch.object(ingest_jobs, "MAX_FINISHED_JOBS", 2):
+        ids = [ingest_jobs.submit(f"doc{i}", list).id for i in range(4)]
+        for job_id in ids[-1:]:
+            _wait(job_id)
+        ingest_jobs.shutdown()
+
+    assert len(ingest_jobs._jobs) == 2
+    assert ingest_jobs.get_job(ids[0]) is None
+
+
+def test_finished_jobs_below_the_limit_are_kept():
+    ids = [ingest_jobs.submit(f"doc{i}", list).id for i in range(700)]
+    _wait(ids[-1])
+    ingest_jobs.shutdown()
+
+    assert all(ingest_jobs.get_job(job_id).status == "done" for job_id in ids)
+    assert all(ingest_jobs.get_job(job_id) is not None for job_id in ids)
+    assert len(ingest_jobs._jobs) == 700
+
+
+def test_uploaded_file_matches_loader_interface():
+    upload = ingest_jobs.UploadedFile("a.csv", b"name\nAda\n")
+    assert upload.name == "a.csv"
+    assert upload.getbuffer().tobytes() == b"name\nAda\n"
@@ -0,0 +1,49 @@
+import src.conversation_store as cs
+from src import metrics
+
+
+def test_histogram_buckets_are_cumulative():
+    h = metrics.Histogram("test_seconds", "Test.", ["op"], buckets=(0.1, 1.0))
+    h.observe(0.05, op="read")
+    h.observe(0.5, op="read")
+    h.observe(5, op="read")
+
+    lines = h.render()
+    assert lines[:2] == ["# HELP test_seconds Test.", "# TYPE test_seconds histogram"]
+    assert 'test_seconds_bucket{op="read",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{op="read",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{op="read",le="+Inf"} 3' in lines
+    assert 'test_seconds_sum{op="read"} 5.55' in lines
+    assert 'test_seconds_count{op="read"} 3' in lines
+    assert h.count(op="read") == 3
+    assert h.count(op="write") == 0
+
+
+def test_time_and_timed_record_durations():
+    h = metrics.Histogram("test_seconds", "Test.")
+
+    with h.time():
+        pass
+
+    @h.timed()
+    def work():
+        return 42
+
+    assert work() == 42
+    assert h.count() == 2
+    assert "test_seconds_count 2" in h.render()
+
+
+def test_label_values_escaped():
+    h = metrics.Histogram("test_seconds", "Test.", ["op"])
+    h.observe(1, op='a"b')
+    assert any('op="a\\"b"' in line for line in h.render())
+
+
+def test_conversation_store_calls_recorded(tmp_path, monkeypatch):
+    cs.close()
+    monkeypatch.setattr(cs, "DB_PATH", tmp_path / "conversations.db")
+    before = metrics.SQLITE_SECONDS.count(operation="create_conversation")
+    cs.create_conversation("Chat")
+    cs.close()
+    assert metrics.SQLITE_SECONDS.count(operation="create_conversation") == before + 1
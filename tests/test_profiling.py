@@ -0,0 +1,81 @@
+import pstats
+import time
+from unittest.mock import patch
+
+import pytest
+
+from src import profiling
+
+
+@pytest.fixture
+def profile_dir(tmp_path):
+    with patch.object(profiling, "PROFILE_DIR", tmp_path / "profiles"):
+        yield tmp_path / "profiles"
+
+
+def test_disabled_ignores_header_and_sampling():
+    with (
+        patch.object(profiling, "PROFILING_ENABLED", False),
+        patch.object(profiling, "PROFILE_SAMPLE_RATE", 1.0),
+    ):
+        assert profiling.should_profile("1") is False
+        assert profiling.should_profile() is False
+
+
+def test_enabled_uses_header_or_sample_rate():
+    with patch.object(profiling, "PROFILING_ENABLED", True):
+        with patch.object(profiling, "PROFILE_SAMPLE_RATE", 0.0):
+            assert profiling.should_profile("1") is True
+            assert profiling.should_profile("false") is False
+            assert profiling.should_profile() is False
+        with patch.object(profiling, "PROFILE_SAMPLE_RATE", 1.0):
+            assert profiling.should_profile() is True
+
+
+def test_profile_thread_writes_pstats(profile_dir):
+    def work():
+        return sum(i * i for i in range(10_000))
+
+    with profiling.profile_thread("ingest", True):
+        work()
+
+    [profile] = profiling.list_profiles()
+    assert profile["kind"] == "prof"
+    stats = pstats.Stats(str(profiling.get_profile_path(profile["name"])))
+    assert any(func[2] == "work" for func in stats.stats)
+
+
+def test_profile_request_writes_collapsed_stacks(profile_dir):
+    with (
+        patch.object(profiling, "PROFILING_ENABLED", True),
+        profiling.profile_request("ask", "1"),
+    ):
+        time.sleep(0.05)
+
+    [profile] = profiling.list_profiles()
+    assert profile["kind"] == "folded"
+    lines = profiling.get_profile_path(profile["name"]).read_text().splitlines()
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any(line.startswith("MainThread;") for line in lines)
+
+
+def test_only_one_profile_at_a_time(profile_dir):
+    with profiling.profile_thread("outer", True), profiling.profile_thread("inner", True):
+        pass
+    assert len(profiling.list_profiles()) == 1
+
+
+def test_old_profiles_pruned(profile_dir):
+    with patch.object(profiling, "MAX_PROFILES", 2):
+        for _ in range(4):
+            with profiling.profile_thread("job", True):
+                pass
+    assert len(profiling.list_profiles()) == 2
+
+
+def test_get_profile_path_rejects_other_files(profile_dir):
+    profile_dir.mkdir()
+    (profile_dir / "notes.txt").write_text("x")
+    assert profiling.get_profile_path("notes.txt") is None
+    assert profiling.get_profile_path("../secrets.prof") is None
+    assert profiling.get_profile_path("missing.prof") is None
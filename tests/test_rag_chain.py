@@ -1,6 +1,13 @@
-from unittest.mock import MagicMock, patch
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.retrievers import BaseRetriever
 
 import src.rag_chain as rag_module
+from src import metrics
 from src.rag_chain import _format_chat_history, reset_chain
 
 
@@ -40,6 +47,30 @@ def test_format_chat_history_max_turns():
     assert "Message 0" not in result
 
 
+def test_format_chat_history_with_summary():
+    """Test that the rolling summary precedes the last turn."""
+    history = [
+        {"role": "user", "content": "Latest question"},
+        {"role": "assistant", "content": "Latest answer"},
+    ]
+
+    result = _format_chat_history(history, summary="Talked about pricing.")
+
+    lines = result.splitlines()
+    assert lines[0] == "Summary of earlier conversation: Talked about pricing."
+    assert lines[1:] == ["User: Latest question", "Assistant: Latest answer"]
+
+
+def test_coalescing_key_normalizes_questions():
+    """Test that trivially different questions share a key within one corpus version."""
+    key = rag_module.coalescing_key("What is  RAG?")
+
+    assert rag_module.coalescing_key("what is rag") == key
+    assert rag_module.coalescing_key("What is RAG?", summary="Earlier chat.") != key
+    with patch("src.rag_chain.get_corpus_version", return_value=-1):
+        assert rag_module.coalescing_key("What is RAG?") != key
+
+
 def test_reset_chain():
     """Test that reset_chain clears the cached chain."""
     rag_module._rag_chain = MagicMock()
@@ -61,6 +92,7 @@ def test_ask_question_with_mocked_chain():
         "filename": "test.pdf",
         "page": 0,
         "chunk_index": 0,
+        "score": 0.82,
     }
     mock_chain.invoke.return_value = {
         "answer": "Test answer",
@@ -76,3 +108,175 @@ def test_ask_question_with_mocked_chain():
         assert len(result["sources"]) == 1
         assert result["sources"][0]["name"] == "test.pdf"
         assert result["sources"][0]["type"] == "pdf"
+        assert result["prompt_tokens"] > 0
+        assert result["k"] == 1
+        assert result["sources"][0]["score"] == 0.82
+        assert result["context_docs"] == [mock_doc]
+
+
+def test_aask_question_with_mocked_chain():
+    """Test aask_question awaits the chain's ainvoke."""
+    mock_chain = MagicMock()
+    mock_doc = MagicMock()
+    mock_doc.page_content = "Async content"
+    mock_doc.metadata = {"source_type": "txt", "filename": "notes.txt"}
+    mock_chain.ainvoke = AsyncMock(return_value={"answer": "Async answer", "context": [mock_doc]})
+
+    with patch("src.rag_chain.get_rag_chain", return_value=mock_chain):
+        result = asyncio.run(rag_module.aask_question("What is this?"))
+
+    assert result["answer"] == "Async answer"
+    assert result["sources"][0]["name"] == "notes.txt"
+    mock_chain.invoke.assert_not_called()
+
+
+def test_aask_question_stream_yields_chunks():
+    """Test aask_question_stream yields answer deltas with sources."""
+    mock_doc = MagicMock()
+    mock_doc.page_content = "Streamed content"
+    mock_doc.metadata = {"source_type": "pdf", "filename": "doc.pdf"}
+
+    async def fake_astream(_inputs):
+        yield {"context": [mock_doc]}
+        yield {"answer": "Hello"}
+        yield {"answer": " world"}
+
+    mock_chain = MagicMock()
+    mock_chain.astream = fake_astream
+
+    async def collect():
+        return [item async for item in rag_module.aask_question_stream("Hi")]
+
+    with patch("src.rag_chain.get_rag_chain", return_value=mock_chain):
+        chunks = asyncio.run(collect())
+
+    assert [text for text, _, _ in chunks] == ["", "Hello", " world"]
+    assert chunks[0][1][0]["name"] == "doc.pdf"
+    assert chunks[-1][1][0]["name"] == "doc.pdf"
+    assert chunks[-1][2] == [mock_doc]
+
+
+def test_aask_question_stream_records_latency_metrics():
+    """Test that a completed stream records time to first token and tokens/s."""
+
+    async def fake_astream(_inputs):
+        yield {"context": []}
+        yield {"answer": "Hello"}
+        await asyncio.sleep(0.01)
+        yield {"answer": " world"}
+
+    mock_chain = MagicMock()
+    mock_chain.astream = fake_astream
+    ttft = metrics.TIME_TO_FIRST_TOKEN_SECONDS.count()
+    rate = metrics.GENERATION_TOKENS_PER_SECOND.count()
+    total = metrics.ASK_SECONDS.count(mode="stream")
+
+    async def collect():
+        return [item async for item in rag_module.aask_question_stream("Hi")]
+
+    with patch("src.rag_chain.get_rag_chain", return_value=mock_chain):
+        asyncio.run(collect())
+
+    assert metrics.TIME_TO_FIRST_TOKEN_SECONDS.count() == ttft + 1
+    assert metrics.GENERATION_TOKENS_PER_SECOND.count() == rate + 1
+    assert metrics.ASK_SECONDS.count(mode="stream") == total + 1
+
+
+class _StaticRetriever(BaseRetriever):
+    docs: list[Document]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        return self.docs
+
+
+def test_rag_chain_packs_context_into_budget():
+    """Test that the chain trims retrieved context to PROMPT_TOKEN_BUDGET."""
+    docs = [
+        Document(page_content="Relevant fact. " * 20, metadata={"filename": "a.txt"}),
+        Document(page_content="Other fact. " * 20, metadata={"filename": "b.txt"}),
+    ]
+    llm = FakeListChatModel(responses=["Packed answer"])
+    reset_chain()
+
+    with (
+        patch("src.rag_chain.get_llm", return_value=(llm, "fake")),
+        patch("src.rag_chain.get_retriever", return_value=_StaticRetriever(docs=docs)),
+        patch("src.rag_chain.get_vector_store", return_value=MagicMock()),
+        patch("src.rag_chain.PROMPT_TOKEN_BUDGET", 150),
+    ):
+        result = rag_module.ask_question("What is relevant?")
+
+    reset_chain()
+    assert result["answer"] == "Packed answer"
+    assert rag_module.estimate_prompt_tokens("What is relevant?", None, docs) > 150
+    assert result["prompt_tokens"] <= 150
+    assert result["sources"][0]["name"] == "a.txt"
+
+
+def test_ask_questions_bounds_concurrency():
+    """Test that batch generations run with bounded concurrency and report per-question errors."""
+    in_flight = 0
+    peak = 0
+
+    async def fake_ainvoke(inputs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        if inputs["input"] == "bad":
+            raise RuntimeError("generation failed")
+        return f"answer to {inputs['input']}"
+
+    chain = MagicMock()
+    chain.ainvoke = fake_ainvoke
+    questions = ["q0", "q1", "bad", "q3", "q4"]
+    contexts = [
+        [Document(page_content="ctx", metadata={"filename": "a.txt", "retrieved_k": 1})]
+        for _ in questions
+    ]
+
+    async def collect():
+        return [r async for r in rag_module.ask_questions(questions, max_concurrency=2)]
+
+    with (
+        patch("src.rag_chain.retrieve_batch", return_value=contexts) as mock_retrieve,
+        patch("src.rag_chain.get_document_chain", return_value=chain),
+    ):
+        results = asyncio.run(collect())
+
+    mock_retrieve.assert_called_once_with(questions)
+    assert peak == 2
+    by_index = {r["index"]: r for r in results}
+    assert sorted(by_index) == [0, 1, 2, 3, 4]
+    assert by_index[0]["answer"] == "answer to q0"
+    assert by_index[0]["sources"][0]["name"] == "a.txt"
+    assert by_index[0]["k"] == 1
+    assert by_index[2]["error"] == "generation failed"
+
+
+def test_rag_chain_reused_until_llm_or_store_changes():
+    """Test that the chain is only rebuilt when the LLM or vector store instance changes."""
+    reset_chain()
+    llm, other_llm, store = MagicMock(), MagicMock(), MagicMock()
+    retriever = _StaticRetriever(docs=[])
+
+    with (
+        patch("src.rag_chain.get_llm", return_value=(llm, "fake")) as mock_get_llm,
+        patch("src.rag_chain.get_retriever", return_value=retriever) as mock_get_retriever,
+        patch("src.rag_chain.get_vector_store", return_value=store),
+        patch(
+            "langchain_classic.chains.combine_documents.create_stuff_documents_chain",
+            side_effect=lambda *a: MagicMock(),
+        ),
+    ):
+        first = rag_module.get_rag_chain()
+        assert rag_module.get_rag_chain() is first
+        assert mock_get_retriever.call_count == 1
+
+        mock_get_llm.return_value = (other_llm, "fake")
+        assert rag_module.get_rag_chain() is not first
+
+    reset_chain()
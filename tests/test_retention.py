@@ -0,0 +1,143 @@
+import sqlite3
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+import src.conversation_store as cs
+from src import retention
+
+
+@pytest.fixture
+def tmp_dir():
+    with tempfile.TemporaryDirectory() as d:
+        yield Path(d)
+
+
+@pytest.fixture
+def store(tmp_dir):
+    cs.close()
+    cs._conn = None
+    with (
+        patch.object(cs, "DB_PATH", tmp_dir / "conversations.db"),
+        patch.object(retention, "ARCHIVE_DIR", tmp_dir / "archive"),
+        patch.object(retention, "BATCH_PAUSE", 0),
+    ):
+        yield tmp_dir
+        cs.close()
+
+
+def _age(cid, days):
+    def update(conn):
+        conn.execute(
+            "UPDATE conversations SET updated_at = datetime('now', ?) WHERE id = ?",
+            (f"-{days} days", cid),
+        )
+
+    cs._write(update)
+
+
+def test_age_policy_archives_then_deletes(store):
+    old = cs.create_conversation("Old")
+    cs.add_message(old, "user", "Hello")
+    cs.add_message(old, "assistant", "Hi", sources=[{"content": "chunk", "name": "a.pdf"}])
+    recent = cs.create_conversation("Recent")
+    _age(old, 120)
+
+    stats = retention.run_retention(max_age_days=90, max_db_mb=0, batch_size=10)
+
+    assert stats["archived"] == 1
+    assert stats["previews_swept"] == 1
+    assert [c["id"] for c in cs.list_conversations()] == [recent]
+    assert cs.get_messages(old) == []
+
+    [segment] = (store / "archive").glob("*.ndjson.gz")
+    [archived] = retention.read_segment(segment)
+    assert archived["title"] == "Old"
+    assert [m["content"] for m in archived["messages"]] == ["Hello", "Hi"]
+    assert archived["messages"][1]["sources"] == [{"content": "chunk", "name": "a.pdf"}]
+
+
+def test_deletes_run_in_bounded_batches(store):
+    for i in range(5):
+        _age(cs.create_conversation(f"Chat {i}"), 30)
+
+    with patch.object(
+        cs, "delete_unchanged_conversations", wraps=cs.delete_unchanged_conversations
+    ) as delete:
+        stats = retention.run_retention(max_age_days=7, max_db_mb=0, batch_size=2)
+
+    assert stats["archived"] == 5
+    assert [len(call.args[0]) for call in delete.call_args_list] == [2, 2, 1]
+    assert len(list((store / "archive").glob("*.ndjson.gz"))) == 3
+
+
+def test_conversation_written_after_export_is_not_deleted(store):
+    cid = cs.create_conversation("Chat")
+    cs.add_message(cid, "user", "Hello")
+    _age(cid, 30)
+    write_segment = retention.write_segment
+
+    def write_then_reply(conversations):
+        path = write_segment(conversations)
+        cs.add_message(cid, "assistant", "Late reply")
+        return path
+
+    with patch.object(retention, "write_segment", side_effect=write_then_reply):
+        stats = retention.run_retention(max_age_days=7, max_db_mb=0)
+
+    assert stats["archived"] == 0
+    assert [m["content"] for m in cs.get_messages(cid)] == ["Hello", "Late reply"]
+
+
+def test_size_policy_removes_oldest_first(store):
+    ids = [cs.create_conversation(f"Chat {i}") for i in range(4)]
+    for cid in ids:
+        cs.add_message(cid, "user", "lorem ipsum dolor " * 3000)
+    limit_mb = cs.database_size() / (1024 * 1024) * 0.6
+
+    retention.run_retention(max_age_days=0, max_db_mb=limit_mb, batch_size=1)
+
+    remaining = [c["id"] for c in cs.list_conversations()]
+    assert remaining and ids[0] not in remaining
+    assert remaining == sorted(remaining, reverse=True) == ids[-len(remaining) :][::-1]
+
+
+def test_incremental_vacuum_shrinks_file(store):
+    cid = cs.create_conversation("Big")
+    for _ in range(20):
+        cs.add_message(cid, "user", "lorem ipsum dolor " * 1200)
+    cs.delete_conversation(cid)
+
+    stats = retention.run_retention(max_age_days=0, max_db_mb=0)
+
+    assert stats["pages_vacuumed"] > 0
+    conn = cs._get_read_conn()
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+
+
+def test_legacy_database_converted_to_incremental_vacuum(store):
+    cs.create_conversation("Chat")
+    cs.close()
+    conn = sqlite3.connect(store / "conversations.db")
+    conn.execute("PRAGMA auto_vacuum=NONE")
+    conn.execute("VACUUM")
+    conn.close()
+
+    # The background pass never runs the blocking full VACUUM itself.
+    assert retention.run_retention(max_age_days=0, max_db_mb=0)["pages_vacuumed"] == 0
+    assert cs.incremental_vacuum_enabled() is False
+
+    retention.main(["--enable-incremental-vacuum"])
+    assert cs.incremental_vacuum_enabled() is True
+    assert cs.enable_incremental_vacuum() is False
+
+
+def test_delete_cascades_with_foreign_keys(store):
+    cid = cs.create_conversation("Chat")
+    cs.add_message(cid, "user", "Hello")
+    cs.delete_conversation(cid)
+    conn = cs._get_read_conn()
+    assert conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 0
+    assert cs.search_messages("hello") == []
@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+
+from src.single_flight import SingleFlight
+
+
+def test_do_shares_one_computation():
+    """Test that concurrent callers with the same key share one call."""
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"answer": "shared"}
+
+    async def run():
+        flights = SingleFlight()
+        results = await asyncio.gather(*(flights.do("key", compute) for _ in range(5)))
+        assert not flights.in_flight("key")
+        return results
+
+    results = asyncio.run(run())
+
+    assert calls == 1
+    assert all(r == {"answer": "shared"} for r in results)
+
+
+def test_do_separates_keys_and_runs_again_later():
+    """Test that different keys and later calls are not coalesced."""
+    calls = []
+
+    async def compute(value):
+        calls.append(value)
+        await asyncio.sleep(0)
+        return value
+
+    async def run():
+        flights = SingleFlight()
+        first = await asyncio.gather(
+            flights.do("a", lambda: compute("a")), flights.do("b", lambda: compute("b"))
+        )
+        second = await flights.do("a", lambda: compute("a"))
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first == ["a", "b"]
+    assert second == "a"
+    assert calls == ["a", "b", "a"]
+
+
+def test_do_propagates_errors_to_all_callers():
+    """Test that every waiting caller sees the shared failure."""
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ConnectionError("No LLM available")
+
+    async def run():
+        flights = SingleFlight()
+        return await asyncio.gather(
+            *(flights.do("key", fail) for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(r, ConnectionError) for r in results)
+
+
+def test_do_survives_one_caller_cancelling():
+    """Test that a cancelled caller does not cancel the shared computation."""
+
+    async def compute():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def run():
+        flights = SingleFlight()
+        leader = asyncio.ensure_future(flights.do("key", compute))
+        follower = asyncio.ensure_future(flights.do("key", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(run()) == "done"
+
+
+def test_stream_broadcasts_to_late_subscribers():
+    """Test that a late joiner replays earlier items and follows the shared stream."""
+    started = 0
+
+    async def tokens():
+        nonlocal started
+        started += 1
+        for token in ["a", "b", "c"]:
+            await asyncio.sleep(0.01)
+            yield token
+
+    async def collect(flights, delay):
+        await asyncio.sleep(delay)
+        return [item async for item in flights.stream("key", tokens)]
+
+    async def run():
+        flights = SingleFlight()
+        return await asyncio.gather(collect(flights, 0), collect(flights, 0.015))
+
+    early, late = asyncio.run(run())
+
+    assert started == 1
+    assert early == late == ["a", "b", "c"]
+
+
+def test_stream_cancels_when_all_subscribers_leave():
+    """Test that the shared stream stops once nobody is listening."""
+    produced = []
+
+    async def tokens():
+        for i in range(100):
+            await asyncio.sleep(0.01)
+            produced.append(i)
+            yield i
+
+    async def run():
+        flights = SingleFlight()
+        stream = flights.stream("key", tokens)
+        assert await anext(stream) == 0
+        await stream.aclose()
+        await asyncio.sleep(0.05)
+        assert not flights.in_flight("key")
+
+    asyncio.run(run())
+
+    assert len(produced) < 5
+
+
+def test_stream_propagates_errors():
+    """Test that subscribers see errors raised by the shared stream."""
+
+    async def tokens():
+        yield "a"
+        raise ConnectionError("lost")
+
+    async def run():
+        flights = SingleFlight()
+        return [item async for item in flights.stream("key", tokens)]
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(run())
@@ -0,0 +1,113 @@
+import asyncio
+import tempfile
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+import src.conversation_store as cs
+from src import summarizer
+
+
+@pytest.fixture(autouse=True)
+def tmp_db():
+    cs.close()
+    cs._conn = None
+    with tempfile.TemporaryDirectory() as d:
+        db_path = Path(d) / "conversations.db"
+        with patch.object(cs, "DB_PATH", db_path):
+            yield
+            cs.close()
+
+
+def _mock_llm(reply):
+    llm = MagicMock()
+    llm.ainvoke = AsyncMock(return_value=MagicMock(content=reply))
+    return llm
+
+
+def test_refresh_summary_keeps_last_turn_out():
+    """Test that only messages before the latest turn are folded in."""
+    cid = cs.create_conversation()
+    for i in range(3):
+        cs.add_message(cid, "user", f"Q{i}")
+        cs.add_message(cid, "assistant", f"A{i}")
+    llm = _mock_llm("User asked Q0 and Q1.")
+
+    with patch("src.summarizer.get_llm", return_value=(llm, "mock")):
+        asyncio.run(summarizer.arefresh_summary(cid))
+
+    assert cs.get_summary(cid) == "User asked Q0 and Q1."
+    prompt = llm.ainvoke.call_args.args[0]
+    assert "User: Q1" in prompt
+    assert "Q2" not in prompt
+    assert [m["content"] for m in cs.get_unsummarized_messages(cid)] == ["Q2", "A2"]
+
+
+def test_refresh_summary_with_write_behind_drops_no_turn():
+    """Test that each prompt sees every earlier turn in the summary or history."""
+    llm = MagicMock()
+    llm.ainvoke = AsyncMock(
+        side_effect=lambda prompt: MagicMock(content=prompt.split("Current summary:")[1])
+    )
+
+    with (
+        patch.object(cs, "WRITE_BEHIND", True),
+        patch.object(cs, "WRITE_BEHIND_INTERVAL_MS", 10_000),
+        patch("src.summarizer.get_llm", return_value=(llm, "mock")),
+    ):
+        cid = cs.create_conversation()
+        for turn in range(4):
+            summary = cs.get_summary(cid) or ""
+            history = [m["content"] for m in cs.get_recent_messages(cid, 2)]
+            for earlier in range(turn):
+                assert f"Q{earlier}" in summary or f"Q{earlier}" in history
+            cs.add_message(cid, "user", f"Q{turn}")
+            cs.add_message(cid, "assistant", f"A{turn}")
+            asyncio.run(summarizer.arefresh_summary(cid))
+
+    assert "Q2" in cs.get_summary(cid)
+    assert [m["content"] for m in cs.get_unsummarized_messages(cid)] == ["Q3", "A3"]
+
+
+def test_refresh_summary_skips_first_turn():
+    """Test that no LLM call is made while only one turn exists."""
+    cid = cs.create_conversation()
+    cs.add_message(cid, "user", "Q0")
+    cs.add_message(cid, "assistant", "A0")
+
+    with patch("src.summarizer.get_llm") as mock_get_llm:
+        asyncio.run(summarizer.arefresh_summary(cid))
+
+    mock_get_llm.assert_not_called()
+    assert cs.get_summary(cid) is None
+
+
+def test_refresh_summary_is_bounded():
+    """Test that an overlong summary is cut to the token budget."""
+    cid = cs.create_conversation()
+    for i in range(2):
+        cs.add_message(cid, "user", f"Q{i}")
+        cs.add_message(cid, "assistant", f"A{i}")
+    llm = _mock_llm("A fact. " * 500)
+
+    with (
+        patch("src.summarizer.get_llm", return_value=(llm, "mock")),
+        patch("src.summarizer.SUMMARY_TOKEN_BUDGET", 20),
+    ):
+        asyncio.run(summarizer.arefresh_summary(cid))
+
+    assert len(cs.get_summary(cid)) <= 80
+
+
+def test_refresh_summary_survives_llm_errors():
+    """Test that LLM failures leave the stored summary untouched."""
+    cid = cs.create_conversation()
+    for i in range(2):
+        cs.add_message(cid, "user", f"Q{i}")
+        cs.add_message(cid, "assistant", f"A{i}")
+
+    with patch("src.summarizer.get_llm", side_effect=ConnectionError("down")):
+        asyncio.run(summarizer.arefresh_summary(cid))
+
+    assert cs.get_summary(cid) is None
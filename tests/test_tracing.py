@@ -0,0 +1,94 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+
+from src import tracing
+
+
+@pytest.fixture
+def trace_file(tmp_path):
+    path = tmp_path / "traces" / "spans.jsonl"
+    tracing._exporter = None
+    with patch.object(tracing, "TRACE_FILE", path):
+        yield path
+    tracing._exporter = None
+
+
+def _read_spans(path):
+    lines = path.read_text().splitlines()
+    return [
+        [
+            span
+            for rs in json.loads(line)["resourceSpans"]
+            for ss in rs["scopeSpans"]
+            for span in ss["spans"]
+        ]
+        for line in lines
+    ]
+
+
+def test_unsampled_requests_export_nothing(trace_file):
+    with tracing.trace("request", sample_rate=0) as root:
+        root.set(k=3)
+        with tracing.span("child") as child:
+            child.set(x=1)
+        tracing.record_span("late", 0)
+    assert tracing.find_span("child") is None
+    assert not trace_file.exists()
+
+
+def test_trace_exported_as_otlp_json_line(trace_file):
+    with tracing.trace("request", sample_rate=1, route="/ask") as root:
+        with tracing.span("retrieval", k=4):
+            pass
+        with tracing.span("llm") as llm:
+            llm.set(prompt_tokens=120, cached=False, score=0.5)
+        root.set(conversation_id=7)
+
+    [spans] = _read_spans(trace_file)
+    by_name = {span["name"]: span for span in spans}
+    root_span = by_name["request"]
+    assert "parentSpanId" not in root_span
+    assert by_name["retrieval"]["parentSpanId"] == root_span["spanId"]
+    assert {span["traceId"] for span in spans} == {root_span["traceId"]}
+    assert len(root_span["traceId"]) == 32
+    assert {"key": "conversation_id", "value": {"intValue": "7"}} in root_span["attributes"]
+    assert {"key": "cached", "value": {"boolValue": False}} in by_name["llm"]["attributes"]
+    assert int(root_span["endTimeUnixNano"]) >= int(root_span["startTimeUnixNano"])
+
+
+def test_spans_from_worker_threads_join_the_trace(trace_file):
+    def work():
+        with tracing.span("in_thread"):
+            pass
+
+    async def handler():
+        with tracing.trace("request", sample_rate=1), tracing.span("outer"):
+            await asyncio.to_thread(work)
+
+    asyncio.run(handler())
+    [spans] = _read_spans(trace_file)
+    by_name = {span["name"]: span for span in spans}
+    assert by_name["in_thread"]["parentSpanId"] == by_name["outer"]["spanId"]
+
+
+def test_errors_mark_span_status(trace_file):
+    with (
+        pytest.raises(ValueError),
+        tracing.trace("request", sample_rate=1),
+        tracing.span("step"),
+    ):
+        raise ValueError("boom")
+
+    [spans] = _read_spans(trace_file)
+    assert all(span["status"] == {"code": 2, "message": "boom"} for span in spans)
+
+
+def test_trace_file_rotates(trace_file):
+    with patch.object(tracing, "TRACE_FILE_MAX_MB", 0.0005):
+        for _ in range(10):
+            with tracing.trace("request", sample_rate=1):
+                pass
+    assert trace_file.with_name("spans.jsonl.1").exists()
@@ -1,4 +1,4 @@
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from langchain_core.documents import Document
 
@@ -90,3 +90,140 @@ def test_clear_store():
 
     mock_collection.delete.assert_called_once()
     assert vs_module._vector_store is None
+
+
+def _scored(*scores):
+    return [(Document(page_content=f"doc {i}", metadata={}), s) for i, s in enumerate(scores)]
+
+
+def test_select_by_score_min_score_cutoff():
+    """Test that results below the minimum score are dropped."""
+    selected = vs_module.select_by_score(_scored(0.8, 0.7, 0.2), min_score=0.3, max_gap=1.0)
+
+    assert [d.page_content for d in selected] == ["doc 0", "doc 1"]
+    assert selected[0].metadata["score"] == 0.8
+    assert all(d.metadata["retrieved_k"] == 2 for d in selected)
+
+
+def test_select_by_score_gap_cutoff():
+    """Test that a sharp score drop ends the result list."""
+    selected = vs_module.select_by_score(_scored(0.9, 0.85, 0.5, 0.45), min_score=0.1, max_gap=0.2)
+
+    assert len(selected) == 2
+
+
+def test_select_by_score_keeps_min_k():
+    """Test that min_k results are kept even when all score poorly."""
+    selected = vs_module.select_by_score(_scored(0.1, 0.05), min_score=0.3, max_gap=0.2, min_k=1)
+
+    assert [d.page_content for d in selected] == ["doc 0"]
+
+
+def _make_scoring_store(query_result):
+    """Create a mock store whose collection returns query_result with 1 - distance scores."""
+    mock_store = MagicMock(spec=vs_module.VectorStore)
+    mock_store._collection = MagicMock()
+    mock_store._collection.query.return_value = query_result
+    mock_store._select_relevance_score_fn.return_value = lambda distance: 1.0 - distance
+    return mock_store
+
+
+def test_get_retriever_is_adaptive():
+    """Test that the retriever fetches max_k candidates and cuts them by score."""
+    mock_store = _make_scoring_store(
+        {
+            "documents": [["a", "b", "c"]],
+            "metadatas": [[{}, {}, {}]],
+            "distances": [[0.1, 0.2, 0.9]],
+        }
+    )
+    mock_store.embeddings.embed_query.return_value = [0.5]
+    vs_module._vector_store = mock_store
+
+    retriever = vs_module.get_retriever(k=5)
+    docs = retriever.invoke("query")
+
+    assert isinstance(retriever, vs_module.AdaptiveRetriever)
+    assert [d.metadata["score"] for d in docs] == [0.9, 0.8]
+    mock_store.embeddings.embed_query.assert_called_once_with("query")
+    call = mock_store._collection.query.call_args
+    assert call.kwargs["query_embeddings"] == [[0.5]]
+    assert call.kwargs["n_results"] == 5
+    assert "embeddings" not in call.kwargs["include"]
+
+    vs_module._vector_store = None
+
+
+def test_retriever_can_carry_stored_embeddings():
+    """Test that stored vectors are attached to metadata on request."""
+    mock_store = _make_scoring_store(
+        {
+            "documents": [["a"]],
+            "metadatas": [[{"filename": "a.txt"}]],
+            "distances": [[0.1]],
+            "embeddings": [[[0.25, 0.75]]],
+        }
+    )
+    mock_store.embeddings.embed_query.return_value = [0.5, 0.5]
+
+    retriever = vs_module.AdaptiveRetriever(vectorstore=mock_store, include_embeddings=True)
+    [doc] = retriever.invoke("query")
+
+    assert doc.metadata["embedding"] == [0.25, 0.75]
+    assert doc.metadata["filename"] == "a.txt"
+    assert "embeddings" in mock_store._collection.query.call_args.kwargs["include"]
+
+
+def test_retrieve_batch_embeds_and_searches_once():
+    """Test that a batch of queries costs one embedding call and one search."""
+    mock_store, mock_collection = _make_mock_store()
+    mock_store._select_relevance_score_fn.return_value = lambda distance: 1.0 - distance
+    mock_collection.query.return_value = {
+        "documents": [["a1", "a2"], ["b1", "b2"]],
+        "metadatas": [[{"filename": "a.txt"}, {"filename": "a.txt"}], [{}, {}]],
+        "distances": [[0.1, 0.2], [0.2, 0.9]],
+    }
+    vs_module._vector_store = mock_store
+    mock_embeddings = MagicMock()
+    mock_embeddings.embed_documents.return_value = [[0.1], [0.2]]
+
+    with patch("src.vector_store.get_embeddings", return_value=mock_embeddings):
+        batches = vs_module.retrieve_batch(["q1", "q2"], k=2)
+
+    mock_embeddings.embed_documents.assert_called_once_with(["q1", "q2"])
+    mock_collection.query.assert_called_once()
+    assert [d.page_content for d in batches[0]] == ["a1", "a2"]
+    assert [d.page_content for d in batches[1]] == ["b1"]
+    assert batches[0][0].metadata["score"] == 0.9
+
+    vs_module._vector_store = None
+
+
+def test_corpus_version_changes_on_add_and_clear():
+    """Test that adding or clearing documents bumps the corpus version."""
+    mock_store, _ = _make_mock_store()
+    vs_module._vector_store = mock_store
+    version = vs_module.get_corpus_version()
+
+    vs_module.add_documents([Document(page_content="chunk", metadata={"chunk_index": 0})])
+    assert vs_module.get_corpus_version() == version + 1
+
+    vs_module.clear_store()
+    assert vs_module.get_corpus_version() == version + 2
+
+
+def test_store_stats_cached_until_documents_change():
+    """Test that store stats are only recomputed after an ingest or clear."""
+    mock_store, _ = _make_mock_store()
+    mock_store._collection.count.return_value = 3
+    mock_store._collection.get.return_value = {"metadatas": [{"filename": "a.pdf"}]}
+    vs_module._vector_store = mock_store
+
+    assert vs_module.get_store_stats() == {"documents": 3, "sources": ["a.pdf"]}
+    vs_module.get_store_stats()
+    assert mock_store._collection.get.call_count == 1
+
+    vs_module.add_documents([Document(page_content="chunk", metadata={"chunk_index": 0})])
+    mock_store._collection.count.return_value = 4
+    assert vs_module.get_store_stats()["documents"] == 4
+    assert mock_store._collection.get.call_count == 2
@@ -0,0 +1,68 @@
+import asyncio
+import threading
+from unittest.mock import MagicMock, patch
+
+from src import warmup
+
+
+def test_components_warm_up_in_parallel():
+    barrier = threading.Barrier(3, timeout=5)
+    components = {name: barrier.wait for name in ("a", "b", "c")}
+    with (
+        patch.object(warmup, "WARMUP_ENABLED", True),
+        patch.object(warmup, "COMPONENTS", components),
+    ):
+        durations = asyncio.run(warmup.warm_up())
+    assert list(durations) == ["a", "b", "c"]
+    assert all(seconds is not None for seconds in durations.values())
+
+
+def test_failed_component_is_logged_and_others_still_warm(caplog):
+    def fail():
+        raise ConnectionError("No LLM available")
+
+    loaded = MagicMock()
+    with (
+        patch.object(warmup, "WARMUP_ENABLED", True),
+        patch.object(warmup, "COMPONENTS", {"embeddings": loaded, "llm": fail}),
+    ):
+        durations = asyncio.run(warmup.warm_up())
+    loaded.assert_called_once()
+    assert durations["llm"] is None
+    assert durations["embeddings"] is not None
+    assert "Warm-up of llm failed" in caplog.text
+
+
+def test_disabled_warm_up_loads_nothing():
+    component = MagicMock()
+    with (
+        patch.object(warmup, "WARMUP_ENABLED", False),
+        patch.object(warmup, "COMPONENTS", {"embeddings": component}),
+    ):
+        assert asyncio.run(warmup.warm_up()) == {}
+    component.assert_not_called()
+
+
+def test_llm_warm_up_prompts_only_providers_not_tested_on_connect():
+    model = MagicMock()
+    with patch.object(warmup, "get_llm", return_value=(model, "ollama")):
+        warmup._warm_llm()
+    model.invoke.assert_not_called()
+    with patch.object(warmup, "get_llm", return_value=(model, "huggingface")):
+        warmup._warm_llm()
+    model.invoke.assert_called_once_with(warmup.WARMUP_TEXT)
+
+
+def test_vector_store_warm_up_searches_only_a_non_empty_store():
+    with (
+        patch.object(warmup, "get_store_stats", return_value={"documents": 0}),
+        patch.object(warmup, "search") as search,
+    ):
+        warmup._warm_vector_store()
+    search.assert_not_called()
+    with (
+        patch.object(warmup, "get_store_stats", return_value={"documents": 3}),
+        patch.object(warmup, "search") as search,
+    ):
+        warmup._warm_vector_store()
+    search.assert_called_once_with(warmup.WARMUP_TEXT, k=1)